@@ -10,3 +10,5 @@ from pdfrw.objects import PdfObject, PdfName, PdfArray, PdfDict
 from pdfrw.objects import IndirectPdfDict, PdfString
 from pdfrw.tokens import PdfTokens
 from pdfrw.errors import PdfParseError
+from pdfrw.compress import CompressionPolicy
+from pdfrw.stats import PdfStats
@@ -6,21 +6,172 @@
 Currently, this sad little file only knows how to decompress
 using the flate (zlib) algorithm.  Maybe more later, but it's
 not a priority for me...
+
+Streams can be compressed by several threads at once (zlib
+releases the GIL while it works), with the same results.
+
+A CompressionPolicy says which streams are compressed, at which
+zlib level, and whether streams that are already compressed are
+compressed again.
+
+A stream can also be compressed from an iterator over chunks of
+its data (see pdfrw.uncompress.streamchunks), so that neither the
+data nor the compressed result is ever held in memory all at once.
 '''
+import tempfile
+import time
 import zlib
-from pdfrw.objects import PdfName
-from pdfrw.uncompress import streamobjects
+from itertools import imap, izip
+from mmap import mmap as mapfile, ACCESS_READ
+from pdfrw.objects import PdfName, PdfRawData
+from pdfrw.uncompress import streamobjects, workerpool
+
+
+class CompressionPolicy(object):
+    ''' Decides which streams are compressed, and how hard.
+        A policy can be given to PdfWriter as its compress
+        argument.
+
+        level is the zlib level (0-9, or -1 for the zlib default)
+        for streams, and levels is a dictionary of levels for
+        particular kinds of stream.  The kind of a stream is its
+        /Subtype, or its /Type if it has no /Subtype (/Image,
+        /Form, /ObjStm, /XRef, /Metadata, ...), or None (content
+        streams, font files, ...).  Streams whose level is 0 are
+        not compressed.  (Object streams and cross-reference
+        streams that PdfWriter makes are always flate encoded,
+        even at level 0.)
+
+        Streams smaller than minsize are not compressed.
+
+        If recompress is set, it is the zlib level that streams
+        which are already flate compressed (without a predictor)
+        are compressed again at.  The result is only used if it
+        is smaller.  Otherwise, streams that have any filter are
+        left alone.
+    '''
+    level = zlib.Z_DEFAULT_COMPRESSION
+    minsize = 0
+    recompress = None
+
+    # Uncompressed streams are compressed unless that makes them
+    # at least this many bytes bigger.  (This is what PdfWriter
+    # has always done.)
+    overhead = 30
+
+    def __init__(self, level=None, levels=None, minsize=None,
+                 recompress=None):
+        if level is not None:
+            self.level = level
+        if minsize is not None:
+            self.minsize = minsize
+        if recompress is not None:
+            self.recompress = recompress
+        self.levels = dict((key is None or key.startswith('/')) and
+                           (key, value) or ('/' + key, value)
+                           for key, value in (levels or {}).iteritems())
+
+    def getlevel(self, kind):
+        ''' Return the zlib level for a kind of stream.
+        '''
+        return self.levels.get(kind, self.level)
 
+    def choose(self, obj, flate=PdfName.FlateDecode, len=len):
+        ''' Return a tuple of (zlib level, True if the data has to
+            be decompressed first, how many bytes the result must
+            save) for a stream that should be compressed, or None.
+            (A negative saving means the result can be that much
+            bigger and still be used.)
+        '''
+        ftype = obj.Filter
+        if ftype is None:
+            level = self.getlevel(obj.Subtype or obj.Type)
+            if level and len(obj._stream) >= self.minsize:
+                return level, False, -self.overhead
+        elif self.recompress is not None:
+            if isinstance(ftype, list) and len(ftype) == 1:
+                ftype = ftype[0]
+            if ftype == flate and obj.DecodeParms is None:
+                return self.recompress, True, 0
+
+defaultpolicy = CompressionPolicy()
+
+
+def compressjob(job, compress=zlib.compress, decompress=zlib.decompress):
+    ''' Compress the data of one stream, given a tuple of
+        (data, level, decompress first).  Returns None if the
+        data couldn't be decompressed.
+    '''
+    data, level, compressed = job
+    if compressed:
+        try:
+            data = decompress(data)
+        except zlib.error:
+            return None
+    return compress(data, level)
+
+
+def compress(mylist, workers=None, policy=None, stats=None,
+             time=time.time):
+    ''' Compress the streams that don't have a filter yet,
+        if that makes them smaller.  If workers is more than 1,
+        that many threads are used to do the compression.
 
-def compress(mylist):
+        policy is the CompressionPolicy to use (see above).
+
+        If stats is a PdfStats, the time taken and the number
+        of streams and bytes compressed are added to it.
+    '''
+    start = stats is not None and time()
     flate = PdfName.FlateDecode
+    choose = (policy or defaultpolicy).choose
+    objs = []
+    jobs = []
     for obj in streamobjects(mylist):
-        ftype = obj.Filter
-        if ftype is not None:
-            continue
-        oldstr = obj.stream
-        newstr = zlib.compress(oldstr)
-        if len(newstr) < len(oldstr) + 30:
+        info = choose(obj)
+        if info is not None:
+            level, compressed, saving = info
+            objs.append((obj, saving))
+            jobs.append((obj.stream, level, compressed))
+    pool = workerpool(workers, jobs)
+    try:
+        newstrs = (pool is not None and pool.imap or imap)(compressjob, jobs)
+        for (obj, saving), (oldstr, level, compressed), newstr in \
+                izip(objs, jobs, newstrs):
+            if newstr is None or len(newstr) >= len(oldstr) - saving:
+                continue
             obj.stream = newstr
             obj.Filter = flate
             obj.DecodeParms = None
+            if stats is not None:
+                stats.add('streams_compressed')
+                stats.add('bytes_compressed', len(oldstr))
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if stats is not None:
+            stats.addtime('compress', time() - start)
+
+
+def compresschunks(obj, chunks, level=zlib.Z_DEFAULT_COMPRESSION):
+    ''' Replace the stream of obj with the flate compressed data
+        from an iterator over chunks of uncompressed data.
+
+        The compressed data goes to a temporary file, and the
+        stream is left as a PdfRawData that refers to it, which
+        PdfWriter copies straight to its output file.
+    '''
+    f = tempfile.TemporaryFile()
+    try:
+        cobj = zlib.compressobj(level)
+        for chunk in chunks:
+            f.write(cobj.compress(chunk))
+        f.write(cobj.flush())
+        f.flush()
+        size = f.tell()
+        fdata = size and mapfile(f.fileno(), 0, access=ACCESS_READ) or ''
+    finally:
+        f.close()
+    obj.stream = PdfRawData(fdata, 0, size)
+    obj.Filter = PdfName.FlateDecode
+    obj.DecodeParms = None
@@ -0,0 +1,450 @@
+# A part of pdfrw (pdfrw.googlecode.com)
+# Copyright (C) 2006-2012 Patrick Maupin, Austin, Texas
+# MIT license -- See LICENSE.txt for details
+
+'''
+Decoders for the standard PDF stream filters.
+
+Each decoder takes an iterable of chunks of encoded data, and the
+decode parameters for its filter (a dictionary of integers keyed
+by name, or None), and returns an iterator over chunks of decoded
+data.  Decoders can be chained together, so even a very big
+stream never has to be decoded all at once.
+
+The image-only filters (DCTDecode, JPXDecode, CCITTFaxDecode and
+JBIG2Decode) are not decoded.  Errors in the data raise ValueError.
+'''
+
+import struct
+import zlib
+from array import array
+from binascii import hexlify, unhexlify
+from pdfrw.objects import PdfRawData
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# How much encoded data to feed to the decoders at once
+CHUNKSIZE = 1 << 16
+
+# Whether 16 bit samples need their bytes swapped
+littleendian = struct.pack('=H', 1) == '\x01\x00'
+
+
+def chunks(data, size=CHUNKSIZE, isinstance=isinstance, xrange=xrange):
+    ''' Split stream data (a string or a PdfRawData) into
+        chunks for decoding.  Data that hasn't been read
+        from the source yet is read one chunk at a time.
+    '''
+    if isinstance(data, PdfRawData):
+        fdata = data.fdata
+        start = data.start
+        end = start + data.length
+    else:
+        fdata = data
+        start = 0
+        end = len(data)
+    for pos in xrange(start, end, size):
+        yield fdata[pos:min(pos + size, end)]
+
+
+def inflate(chunks, CHUNKSIZE=CHUNKSIZE):
+    ''' Decompress zlib (flate) data.  Output is produced a
+        piece at a time, so that a small chunk that expands
+        to a lot of data doesn't all have to be in memory.
+    '''
+    dco = zlib.decompressobj()
+    for chunk in chunks:
+        while chunk:
+            data = dco.decompress(chunk, CHUNKSIZE)
+            if data:
+                yield data
+            chunk = dco.unconsumed_tail
+        if dco.unused_data:
+            break
+    data = dco.flush()
+    if data:
+        yield data
+    if dco.unused_data.strip():
+        raise ValueError('Unconsumed compression data: %s' %
+                         repr(dco.unused_data[:20]))
+
+
+def lzw(chunks, earlychange=1, ord=ord, len=len):
+    ''' Decompress LZW data.
+    '''
+    def clear():
+        table = [chr(i) for i in range(256)]
+        table += [None, None]
+        return table, 9, None
+
+    table, codelen, prev = clear()
+    bitbuf = nbits = 0
+    for chunk in chunks:
+        output = []
+        for ch in chunk:
+            bitbuf = (bitbuf << 8) | ord(ch)
+            nbits += 8
+            if nbits < codelen:
+                continue
+            nbits -= codelen
+            code = bitbuf >> nbits
+            bitbuf &= (1 << nbits) - 1
+            if code == 256:
+                table, codelen, prev = clear()
+                continue
+            if code == 257:
+                yield ''.join(output)
+                return
+            if code < len(table):
+                entry = table[code]
+                if prev is not None and len(table) < 4096:
+                    table.append(prev + entry[0])
+            elif code == len(table) and prev is not None:
+                entry = prev + prev[0]
+                table.append(entry)
+            else:
+                raise ValueError('Invalid LZW code %d' % code)
+            output.append(entry)
+            prev = entry
+            if len(table) + earlychange >= 1 << codelen and codelen < 12:
+                codelen += 1
+        yield ''.join(output)
+
+
+def asciihexdecode(chunks, parms=None):
+    ''' Decode ASCIIHexDecode data (up to the > that ends it).
+    '''
+    odd = ''
+    for chunk in chunks:
+        end = chunk.find('>')
+        if end >= 0:
+            chunk = chunk[:end]
+        data = odd + ''.join(chunk.split())
+        odd = data[len(data) & ~1:]
+        try:
+            yield data[:len(data) & ~1].decode('hex')
+        except TypeError:
+            raise ValueError('Invalid character in ASCIIHexDecode data')
+        if end >= 0:
+            break
+    if odd:
+        yield (odd + '0').decode('hex')
+
+
+def ascii85decode(chunks, parms=None, pack=struct.pack, ord=ord):
+    ''' Decode ASCII85Decode data (up to the ~> that ends it).
+    '''
+    extra = ''
+    first = True
+    for chunk in chunks:
+        data = extra + ''.join(chunk.split())
+        if first and data[:2] == '<~':
+            data = data[2:]
+        first = False
+        end = data.find('~')
+        if end >= 0:
+            data = data[:end]
+        data = data.replace('z', '!!!!!')
+        size = len(data) - len(data) % 5
+        extra = data[size:]
+        values = []
+        for pos in xrange(0, size, 5):
+            value = 0
+            for ch in data[pos:pos + 5]:
+                value = value * 85 + ord(ch) - 33
+            values.append(value)
+        try:
+            yield pack('>%dL' % len(values), *values)
+        except struct.error:
+            raise ValueError('Invalid ASCII85Decode data')
+        if end >= 0:
+            break
+    if extra:
+        if len(extra) == 1:
+            raise ValueError('Invalid ASCII85Decode data')
+        value = 0
+        for ch in (extra + 'uuuu')[:5]:
+            value = value * 85 + ord(ch) - 33
+        try:
+            yield pack('>L', value)[:len(extra) - 1]
+        except struct.error:
+            raise ValueError('Invalid ASCII85Decode data')
+
+
+def runlengthdecode(chunks, parms=None, ord=ord, len=len):
+    ''' Decode RunLengthDecode data.
+    '''
+    extra = ''
+    for chunk in chunks:
+        data = extra + chunk
+        output = []
+        pos = 0
+        end = len(data)
+        while pos < end:
+            length = ord(data[pos])
+            if length < 128:
+                if pos + length + 2 > end:
+                    break
+                output.append(data[pos + 1:pos + length + 2])
+                pos += length + 2
+            elif length > 128:
+                if pos + 2 > end:
+                    break
+                output.append(data[pos + 1] * (257 - length))
+                pos += 2
+            else:
+                yield ''.join(output)
+                return
+        extra = data[pos:]
+        yield ''.join(output)
+    if extra:
+        raise ValueError('Incomplete RunLengthDecode data')
+
+
+def rowblocks(chunks, rowlen):
+    ''' Regroup chunks of data into blocks of whole rows.
+    '''
+    extra = ''
+    for chunk in chunks:
+        data = extra + chunk
+        size = len(data) - len(data) % rowlen
+        if size:
+            yield data[:size]
+        extra = data[size:]
+    if extra:
+        raise ValueError('Incomplete row of predicted data')
+
+
+def rows(chunks, rowlen):
+    ''' Regroup chunks of data into rows.
+    '''
+    for data in rowblocks(chunks, rowlen):
+        for pos in xrange(0, len(data), rowlen):
+            yield data[pos:pos + rowlen]
+
+
+def tiffpredictor(chunks, rowlen, colors, bpc):
+    ''' Undo TIFF predictor 2 (each sample is the difference
+        from the same color component of the pixel to its left).
+    '''
+    for row in rows(chunks, rowlen):
+        if bpc == 8:
+            row = bytearray(row)
+            for i in xrange(colors, rowlen):
+                row[i] = (row[i] + row[i - colors]) & 0xFF
+        elif bpc == 16:
+            row = array('H', row)
+            if littleendian:
+                row.byteswap()
+            for i in xrange(colors, len(row)):
+                row[i] = (row[i] + row[i - colors]) & 0xFFFF
+            if littleendian:
+                row.byteswap()
+            row = row.tostring()
+        else:
+            # 1, 2 or 4 bits per component
+            mask = (1 << bpc) - 1
+            perbyte = 8 // bpc
+            shifts = range(8 - bpc, -1, -bpc)
+            samples = [(ord(ch) >> shift) & mask
+                       for ch in row for shift in shifts]
+            for i in xrange(colors, len(samples)):
+                samples[i] = (samples[i] + samples[i - colors]) & mask
+            row = bytearray(rowlen)
+            for i in xrange(rowlen):
+                value = 0
+                for sample in samples[i * perbyte:(i + 1) * perbyte]:
+                    value = (value << bpc) | sample
+                row[i] = value
+        yield str(row)
+
+
+def pngsub(row, prev, bpp, rowlen):
+    ''' Undo the PNG Sub filter on a bytearray row.
+    '''
+    for i in xrange(bpp, rowlen):
+        row[i] = (row[i] + row[i - bpp]) & 0xFF
+
+
+def pngaverage(row, prev, bpp, rowlen):
+    ''' Undo the PNG Average filter on a bytearray row.
+    '''
+    for i in xrange(bpp):
+        row[i] = (row[i] + (prev[i] >> 1)) & 0xFF
+    for i in xrange(bpp, rowlen):
+        row[i] = (row[i] + ((row[i - bpp] + prev[i]) >> 1)) & 0xFF
+
+
+def pngpaeth(row, prev, bpp, rowlen, abs=abs):
+    ''' Undo the PNG Paeth filter on a bytearray row.
+    '''
+    for i in xrange(bpp):
+        row[i] = (row[i] + prev[i]) & 0xFF
+    for i in xrange(bpp, rowlen):
+        a = row[i - bpp]
+        b = prev[i]
+        c = prev[i - bpp]
+        pa = abs(b - c)
+        pb = abs(a - c)
+        pc = abs(a + b - c - c)
+        if pa <= pb and pa <= pc:
+            row[i] = (row[i] + a) & 0xFF
+        elif pb <= pc:
+            row[i] = (row[i] + b) & 0xFF
+        else:
+            row[i] = (row[i] + c) & 0xFF
+
+
+def pngrows(chunks, rowlen, bpp, ord=ord, long=long, hexlify=hexlify,
+            unhexlify=unhexlify, bytearray=bytearray, str=str):
+    ''' Undo PNG prediction a row at a time.
+
+        Up rows are added to the previous row all at once, by
+        treating both rows as long integers and adding them
+        without letting carries cross the byte boundaries.
+    '''
+    low = long('7f' * rowlen, 16)
+    high = long('80' * rowlen, 16)
+    fmt = '%%0%dx' % (2 * rowlen)
+    prev = '\0' * rowlen
+    prevlong = 0
+    for row in rows(chunks, rowlen + 1):
+        filter_byte = ord(row[0])
+        row = row[1:]
+        if filter_byte == 2:
+            value = long(hexlify(row), 16)
+            if prevlong is None:
+                prevlong = long(hexlify(prev), 16)
+            value = (((value & low) + (prevlong & low)) ^
+                     ((value ^ prevlong) & high))
+            row = unhexlify(fmt % value)
+            prevlong = value
+        else:
+            if filter_byte == 1:
+                row = bytearray(row)
+                pngsub(row, None, bpp, rowlen)
+                row = str(row)
+            elif filter_byte == 3:
+                row = bytearray(row)
+                pngaverage(row, bytearray(prev), bpp, rowlen)
+                row = str(row)
+            elif filter_byte == 4:
+                row = bytearray(row)
+                pngpaeth(row, bytearray(prev), bpp, rowlen)
+                row = str(row)
+            elif filter_byte:
+                raise ValueError('Unsupported PNG filter %r' % filter_byte)
+            prevlong = None
+        prev = row
+        yield row
+
+
+def pngarrays(chunks, rowlen, bpp, numpy=numpy):
+    ''' Undo PNG prediction using numpy, on blocks of rows.
+
+        Consecutive rows that use the same filter are done
+        together:  a run of Up rows is a running sum down the
+        columns, and a run of Sub rows is a running sum along
+        each row (for each byte of a pixel).  Average and Paeth
+        rows depend on bytes of the same row that have just been
+        decoded, so those are done a row at a time, and so are
+        Sub rows that are not a whole number of pixels long.
+    '''
+    undoers = {1: pngsub, 3: pngaverage, 4: pngpaeth}
+    uint8 = numpy.uint8
+    prev = numpy.zeros(rowlen, uint8)
+    for data in rowblocks(chunks, rowlen + 1):
+        block = numpy.frombuffer(data, uint8).reshape(-1, rowlen + 1)
+        ftypes = block[:, 0]
+        if ftypes.max() > 4:
+            raise ValueError('Unsupported PNG filter %r' % ftypes.max())
+        block = block[:, 1:].copy()
+        starts = numpy.flatnonzero(numpy.diff(ftypes)) + 1
+        starts = [0] + starts.tolist() + [len(block)]
+        for start, end in zip(starts, starts[1:]):
+            filter_byte = ftypes[start]
+            run = block[start:end]
+            if filter_byte == 2:
+                run.cumsum(axis=0, dtype=uint8, out=run)
+                run += prev
+            elif filter_byte == 1 and not rowlen % bpp:
+                run = run.reshape(end - start, -1, bpp)
+                run.cumsum(axis=1, dtype=uint8, out=run)
+            elif filter_byte:
+                undo = undoers[filter_byte]
+                prevrow = bytearray(prev.tostring())
+                for row in run:
+                    rowdata = bytearray(row.tostring())
+                    undo(rowdata, prevrow, bpp, rowlen)
+                    row[:] = numpy.frombuffer(str(rowdata), uint8)
+                    prevrow = rowdata
+            prev = block[end - 1]
+        yield block.tostring()
+
+
+def pngpredictor(chunks, rowlen, bpp, numpy=numpy):
+    ''' Undo PNG prediction, where each row starts with a byte
+        saying how it was predicted.  numpy is used if it is
+        available.
+    '''
+    if numpy is not None:
+        return pngarrays(chunks, rowlen, bpp)
+    return pngrows(chunks, rowlen, bpp)
+
+
+def predictor(chunks, parms):
+    ''' Undo the predictor (if any) given in the decode
+        parameters of a FlateDecode or LZWDecode stream.
+    '''
+    parms = parms or {}
+    predictor = parms.get('/Predictor', 1)
+    if predictor == 1:
+        return chunks
+    colors = parms.get('/Colors', 1)
+    bpc = parms.get('/BitsPerComponent', 8)
+    columns = parms.get('/Columns', 1)
+    if bpc not in (1, 2, 4, 8, 16) or colors < 1 or columns < 1:
+        raise ValueError('Invalid predictor parameters %r' % parms)
+    rowlen = (colors * bpc * columns + 7) // 8
+    if predictor == 2:
+        return tiffpredictor(chunks, rowlen, colors, bpc)
+    if 10 <= predictor <= 15:
+        return pngpredictor(chunks, rowlen, (colors * bpc + 7) // 8)
+    raise ValueError('Unsupported predictor %r' % predictor)
+
+
+def flatedecode(chunks, parms=None):
+    return predictor(inflate(chunks), parms)
+
+
+def lzwdecode(chunks, parms=None):
+    earlychange = (parms or {}).get('/EarlyChange', 1)
+    return predictor(lzw(chunks, earlychange), parms)
+
+
+decoders = {
+    '/FlateDecode': flatedecode,
+    '/LZWDecode': lzwdecode,
+    '/ASCIIHexDecode': asciihexdecode,
+    '/ASCII85Decode': ascii85decode,
+    '/RunLengthDecode': runlengthdecode,
+}
+
+# Abbreviations (for inline images, but sometimes seen elsewhere)
+decoders.update({'/Fl': flatedecode, '/LZW': lzwdecode,
+                 '/AHx': asciihexdecode, '/A85': ascii85decode,
+                 '/RL': runlengthdecode})
+
+
+def decode(data, filters):
+    ''' Decode stream data, given a list of (filter name,
+        decode parameters) pairs, and return an iterator over
+        chunks of the decoded data.
+    '''
+    result = chunks(data)
+    for name, parms in filters:
+        result = decoders[name](result, parms)
+    return result
@@ -14,3 +14,4 @@ from pdfrw.objects.pdfarray import PdfArray
 from pdfrw.objects.pdfobject import PdfObject
 from pdfrw.objects.pdfstring import PdfString
 from pdfrw.objects.pdfindirect import PdfIndirect
+from pdfrw.objects.pdfrawdata import PdfRawData
@@ -2,63 +2,164 @@
 # Copyright (C) 2006-2012 Patrick Maupin, Austin, Texas
 # MIT license -- See LICENSE.txt for details
 
+from itertools import imap
+
 from pdfrw.objects.pdfindirect import PdfIndirect
 from pdfrw.objects.pdfobject import PdfObject
 
 
-def _resolved():
-    pass
+def _real(value, isinstance=isinstance, PdfIndirect=PdfIndirect,
+          PdfNull=PdfObject('null')):
+    ''' Return the object a transient reference refers to
+    '''
+    if isinstance(value, PdfIndirect):
+        value = value.real_value()
+        if value is None:
+            value = PdfNull
+    return value
 
 
 class PdfArray(list):
     ''' A PdfArray maps the PDF file array object into a Python list.
         It has an indirect attribute which defaults to False.
+
+        If the array was read from a file, rawdata holds the
+        span of source bytes it was parsed from, and dirty is
+        set if it has been changed since it was created.
+
+        Transient references (see PdfIndirect) are not replaced
+        by the objects they refer to, but are resolved every time
+        they are retrieved.
+
+        The attributes are kept in slots, and an attribute dictionary
+        is only created if other attributes are set on the array.
     '''
-    indirect = False
+    __slots__ = ('indirect', 'dirty', 'rawdata', 'transient', '_resolved',
+                 '__dict__')
 
     def __init__(self, source=[]):
-        self._resolve = self._resolver
-        self.extend(source)
+        self.indirect = False
+        self.dirty = False
+        self.rawdata = None
+        self.transient = False
+        self._resolved = False
+        list.extend(self, source)
 
-    def _resolver(self, isinstance=isinstance, enumerate=enumerate,
-                  listiter=list.__iter__, PdfIndirect=PdfIndirect,
-                  resolved=_resolved, PdfNull=PdfObject('null')):
-        for index, value in enumerate(list.__iter__(self)):
+    def _resolve(self, isinstance=isinstance, enumerate=enumerate,
+                 listiter=list.__iter__, PdfIndirect=PdfIndirect,
+                 PdfNull=PdfObject('null'), listset=list.__setitem__):
+        ''' Replace references with the objects they refer to,
+            the first time anything is retrieved from the array.
+        '''
+        for index, value in enumerate(listiter(self)):
                 if isinstance(value, PdfIndirect):
+                    if value.transient:
+                        self.transient = True
+                        continue
                     value = value.real_value()
                     if value is None:
                         value = PdfNull
-                    self[index] = value
-        self._resolve = resolved
+                    listset(self, index, value)
+        self._resolved = True
 
-    def __getitem__(self, index, listget=list.__getitem__):
-        self._resolve()
-        return listget(self, index)
+    def __getitem__(self, index, listget=list.__getitem__, real=_real,
+                    isinstance=isinstance, slice=slice):
+        if not self._resolved:
+            self._resolve()
+        value = listget(self, index)
+        if self.transient:
+            if isinstance(index, slice):
+                return [real(x) for x in value]
+            return real(value)
+        return value
 
-    def __getslice__(self, index, listget=list.__getslice__):
-        self._resolve()
-        return listget(self, index)
+    def __getslice__(self, i, j, listget=list.__getslice__, real=_real):
+        if not self._resolved:
+            self._resolve()
+        value = listget(self, i, j)
+        if self.transient:
+            return [real(x) for x in value]
+        return value
 
-    def __iter__(self, listiter=list.__iter__):
-        self._resolve()
+    def __iter__(self, listiter=list.__iter__, imap=imap, real=_real):
+        if not self._resolved:
+            self._resolve()
+        if self.transient:
+            return imap(real, listiter(self))
         return listiter(self)
 
     def count(self, item):
-        self._resolve()
+        if not self._resolved:
+            self._resolve()
+        if self.transient:
+            return list(self).count(item)
         return list.count(self, item)
 
     def index(self, item):
-        self._resolve()
+        if not self._resolved:
+            self._resolve()
+        if self.transient:
+            return list(self).index(item)
         return list.index(self, item)
 
     def remove(self, item):
-        self._resolve()
+        if not self._resolved:
+            self._resolve()
+        self.dirty = True
+        if self.transient:
+            return list.__delitem__(self, self.index(item))
         return list.remove(self, item)
 
     def sort(self, *args, **kw):
-        self._resolve()
+        if not self._resolved:
+            self._resolve()
+        self.dirty = True
         return list.sort(self, *args, **kw)
 
     def pop(self, *args):
-        self._resolve()
-        return list.pop(self, *args)
+        if not self._resolved:
+            self._resolve()
+        self.dirty = True
+        return _real(list.pop(self, *args))
+
+    # The remaining methods only need to note the change
+
+    def __setitem__(self, index, value, listset=list.__setitem__):
+        self.dirty = True
+        return listset(self, index, value)
+
+    def __delitem__(self, index, listdel=list.__delitem__):
+        self.dirty = True
+        return listdel(self, index)
+
+    def __setslice__(self, i, j, value, listset=list.__setslice__):
+        self.dirty = True
+        return listset(self, i, j, value)
+
+    def __delslice__(self, i, j, listdel=list.__delslice__):
+        self.dirty = True
+        return listdel(self, i, j)
+
+    def __iadd__(self, other, listadd=list.__iadd__):
+        self.dirty = True
+        return listadd(self, other)
+
+    def __imul__(self, count, listmul=list.__imul__):
+        self.dirty = True
+        return listmul(self, count)
+
+    def append(self, value, listappend=list.append):
+        self.dirty = True
+        return listappend(self, value)
+
+    def extend(self, values, listextend=list.extend):
+        self.dirty = True
+        return listextend(self, values)
+
+    def insert(self, index, value, listinsert=list.insert):
+        self.dirty = True
+        return listinsert(self, index, value)
+
+    def reverse(self, listreverse=list.reverse):
+        self.dirty = True
+        return listreverse(self)
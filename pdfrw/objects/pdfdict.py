@@ -5,6 +5,10 @@
 from pdfrw.objects.pdfname import PdfName
 from pdfrw.objects.pdfindirect import PdfIndirect
 from pdfrw.objects.pdfobject import PdfObject
+from pdfrw.objects.pdfrawdata import PdfRawData
+
+# Sets a slot, without going through PdfDict.__setattr__
+_setslot = object.__setattr__
 
 
 class _DictSearch(object):
@@ -39,7 +43,12 @@ class _Private(object):
         vars(self)['pdfdict'] = pdfdict
 
     def __setattr__(self, name, value):
-        vars(self.pdfdict)[name] = value
+        pdfdict = self.pdfdict
+        info = pdfdict._special.get(name)
+        if info is None:
+            vars(pdfdict)[name] = value
+        else:
+            _setslot(pdfdict, info[0], value)
 
 
 class PdfDict(dict):
@@ -73,48 +82,86 @@ class PdfDict(dict):
                          will search through the object hierarchy for any desired
                          attribute, such as /Rotate or /MediaBox
 
-        - PdfDicts also have the following special attributes:
-            - indirect is not stored in the PDF dictionary, but in the object's
-              attribute dictionary
-            - stream is also stored in the object's attribute dictionary
-              and will also update the stream length.
-            - _stream will store in the object's attribute dictionary without
-              updating the stream length.
+        - PdfDicts also have the following special attributes, which
+          are kept in slots rather than in the object's attribute
+          dictionary (which is only created if private attributes
+          are used):
+            - indirect is not stored in the PDF dictionary
+            - stream is not stored in the PDF dictionary either,
+              and setting it will also update the stream length.  The stored value
+              may be a PdfRawData reference into the source file, in
+              which case it is read (and replaced by the actual
+              data) the first time the stream attribute is accessed.
+            - _stream will store the stream without
+              updating the stream length.  Reading _stream returns
+              the stored value without reading any deferred data.
+            - rawdata is the span of source bytes the dictionary was
+              parsed from, if it was read from a file.
+            - dirty is set when the dictionary is changed after it
+              has been created.
 
             It is possible, for example, to have a PDF name such as "/indirect"
             or "/stream", but you cannot access such a name as an attribute:
 
-                mydict.indirect -- accesses object's attribute dictionary
+                mydict.indirect -- accesses object's indirect attribute
                 mydict["/indirect"] -- accesses actual PDF dictionary
     '''
-    indirect = False
-    stream = None
+    __slots__ = ('indirect', 'dirty', 'rawdata', '_streamdata', '__dict__')
+
+    # What indirect is set to when a dictionary is created
+    _default_indirect = False
 
     _special = dict(indirect=('indirect', False),
-                    stream=('stream', True),
-                    _stream=('stream', False),
+                    stream=('_streamdata', True),
+                    _stream=('_streamdata', False),
+                    _streamdata=('_streamdata', False),
+                    dirty=('dirty', False),
+                    rawdata=('rawdata', False),
                     )
 
     whitespace = '\x00 \t\f'
     delimiters = r'()<>{}[\]/%'
     forbidden = whitespace + delimiters
 
-    def __setitem__(self, name, value, setter=dict.__setitem__):
+    def __setitem__(self, name, value, setter=dict.__setitem__,
+                    setslot=_setslot):
         assert name.startswith('/'), name
         assert not any((c in self.forbidden) for c in name[1:]), name
         if value is not None:
+            setslot(self, 'dirty', True)
             setter(self, name, value)
         elif name in self:
             del self[name]
 
+    def __delitem__(self, name, deleter=dict.__delitem__, setslot=_setslot):
+        setslot(self, 'dirty', True)
+        deleter(self, name)
+
+    def update(self, *args, **kw):
+        _setslot(self, 'dirty', True)
+        dict.update(self, *args, **kw)
+
+    def clear(self):
+        _setslot(self, 'dirty', True)
+        dict.clear(self)
+
+    def setdefault(self, key, value=None):
+        if key not in self:
+            self[key] = value
+        return self.get(key)
+
     def __init__(self, *args, **kw):
+        _setslot(self, 'indirect', self._default_indirect)
+        _setslot(self, 'dirty', False)
+        _setslot(self, 'rawdata', None)
+        _setslot(self, '_streamdata', None)
         if args:
             if len(args) == 1:
                 args = args[0]
-            self.update(args)
+            dict.update(self, args)
             if isinstance(args, PdfDict):
                 self.indirect = args.indirect
-                self._stream = args.stream
+                self._stream = args._stream
         for key, value in kw.iteritems():
             setattr(self, key, value)
 
@@ -125,6 +172,22 @@ class PdfDict(dict):
         '''
         return self.get(PdfName(name))
 
+    def _resolvekey(self, key, value, setter=dict.__setitem__,
+                 deleter=dict.__delitem__):
+        ''' Replace a reference with the object it refers to.
+            This does not count as a change to the dictionary.
+            (Transient references are left in place.)
+        '''
+        transient = value.transient
+        value = value.real_value()
+        if transient:
+            return value
+        if value is not None:
+            setter(self, key, value)
+        else:
+            deleter(self, key)
+        return value
+
     def get(self, key, dictget=dict.get, isinstance=isinstance,
             PdfIndirect=PdfIndirect):
         ''' Get a value out of the dictionary, after resolving any indirect
@@ -132,14 +195,14 @@ class PdfDict(dict):
         '''
         value = dictget(self, key)
         if isinstance(value, PdfIndirect):
-            self[key] = value = value.real_value()
+            value = self._resolvekey(key, value)
         return value
 
     def __getitem__(self, key):
         return self.get(key)
 
     def __setattr__(self, name, value, special=_special.get, PdfName=PdfName,
-                    vars=vars):
+                    setslot=_setslot):
         ''' Set an attribute on the dictionary.  Handle the keywords
             indirect, stream, and _stream specially (for content objects)
         '''
@@ -148,7 +211,7 @@ class PdfDict(dict):
             self[PdfName(name)] = value
         else:
             name, setlen = info
-            vars(self)[name] = value
+            setslot(self, name, value)
             if setlen:
                 notnone = value is not None
                 self.Length = notnone and PdfObject(len(value)) or None
@@ -159,7 +222,7 @@ class PdfDict(dict):
         '''
         for key, value in list(dictiter(self)):
             if isinstance(value, PdfIndirect):
-                self[key] = value = value.real_value()
+                value = self._resolvekey(key, value)
             if value is not None:
                 assert key.startswith('/'), (key, value)
                 yield key, value
@@ -193,6 +256,7 @@ class PdfDict(dict):
         return value
 
     def popitem(self):
+        _setslot(self, 'dirty', True)
         key, value = dict.pop(self)
         if isinstance(value, PdfIndirect):
             value = value.real_value()
@@ -209,6 +273,25 @@ class PdfDict(dict):
         return _DictSearch(self)
     inheritable = property(inheritable)
 
+    def stream(self, isinstance=isinstance, PdfRawData=PdfRawData, str=str,
+               setslot=_setslot):
+        ''' Return the stream data (or None), first reading it
+            from the source if it was deferred.
+        '''
+        value = self._streamdata
+        if isinstance(value, PdfRawData):
+            value = str(value)
+            setslot(self, '_streamdata', value)
+        return value
+    stream = property(stream)
+
+    def _stream(self):
+        ''' Return the stream as stored -- possibly a PdfRawData
+            that has not been read yet.
+        '''
+        return self._streamdata
+    _stream = property(_stream)
+
     def private(self):
         ''' Allows setting private metadata for use in
             processing (not sent to PDF file).
@@ -223,4 +306,5 @@ class IndirectPdfDict(PdfDict):
         create a direct PdfDict and then set indirect = True on it,
         or you could just create an IndirectPdfDict.
     '''
-    indirect = True
+    __slots__ = ()
+    _default_indirect = True
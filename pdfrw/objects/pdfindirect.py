@@ -3,20 +3,21 @@
 # MIT license -- See LICENSE.txt for details
 
 
-class _NotLoaded(object):
-    pass
-
-
 class PdfIndirect(tuple):
     ''' A placeholder for an object that hasn't been read in yet.
         The object itself is the (object number, generation number) tuple.
-        The attributes include information about where the object is
-        referenced from and the file object to retrieve the real object from.
+
+        To keep placeholders small, they have no attributes of their
+        own.  A reader makes a subclass of PdfIndirect with a _loader
+        that reads (or finds the already read) object for a key,
+        and real_value asks the loader every time.
+
+        A transient placeholder is never replaced by the object it
+        refers to inside arrays and dictionaries, so that the reader
+        can throw the object away and read it again later.
     '''
-    value = _NotLoaded
+    __slots__ = ()
+    transient = False
 
-    def real_value(self, NotLoaded=_NotLoaded):
-        value = self.value
-        if value is NotLoaded:
-            value = self.value = self._loader(self)
-        return value
+    def real_value(self):
+        return self._loader(self)
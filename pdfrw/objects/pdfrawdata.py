@@ -0,0 +1,28 @@
+# A part of pdfrw (pdfrw.googlecode.com)
+# Copyright (C) 2006-2012 Patrick Maupin, Austin, Texas
+# MIT license -- See LICENSE.txt for details
+
+
+class PdfRawData(object):
+    ''' A PdfRawData is a reference to a span of bytes inside
+        a source buffer (usually the PDF file being read, which
+        may be memory-mapped) that has not been copied out yet.
+        str() of the object returns the actual bytes, and the
+        buffer method returns them without making a copy.
+    '''
+    __slots__ = 'fdata', 'start', 'length'
+
+    def __init__(self, fdata, start, length):
+        self.fdata = fdata
+        self.start = start
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __str__(self):
+        start = self.start
+        return self.fdata[start:start + self.length]
+
+    def buffer(self, buffer=buffer):
+        return buffer(self.fdata, self.start, self.length)
@@ -7,15 +7,291 @@ The PdfReader class reads an entire PDF file into memory and
 parses the top-level container objects.  (It does not parse
 into streams.)  The object subclasses PdfDict, and the
 document pages are stored in a list in the pages attribute
-of the object.
+of the object.  (Pages are only read from the page tree as they
+are asked for.)
+
+Alternatively, the file can be memory-mapped rather than read,
+in which case the parser works directly on the mapped buffer.
+
+Objects inside compressed object streams are not read until they
+are needed; the most recently used object streams are kept
+decompressed.
+
+If a memory budget is given, objects that have been read are kept
+in a least-recently-used cache rather than forever, and objects that
+have not been changed (and that nothing else is using) are thrown
+away when the cache grows past the budget, to be read again from the
+source if they are needed again.
+
+If the cross-reference data is missing or can't be parsed, or too
+many objects are not where it says they are, the offsets of the
+objects are found by scanning the whole file once instead.
+
+If stats is given (a PdfStats from pdfrw.stats, or True), time spent
+parsing the cross-reference data, loading objects and decompressing
+is recorded, along with the problems in the file that were recovered
+from.
 '''
+import bisect
+import copy
 import gc
+import os
+import re
 import struct
+import sys
+import time
+from collections import OrderedDict
+from itertools import izip
+from mmap import mmap as mapfile, ACCESS_READ
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 from pdfrw.errors import PdfParseError, log
-from pdfrw.tokens import PdfTokens
+from pdfrw.tokens import PdfTokens, shared_pool
 from pdfrw.objects import PdfDict, PdfArray, PdfName, PdfObject, PdfIndirect
-from pdfrw.uncompress import uncompress
+from pdfrw.objects import PdfRawData
+from pdfrw.uncompress import uncompress, workerpool
+from pdfrw.stats import PdfStats
+from pdfrw import xrefcache
+
+
+def decode_xref(data, widths, count, numpy=numpy):
+    ''' Decode the rows of an uncompressed cross-reference
+        stream.  Returns a list of the values of each of the
+        first three fields, with the defaults for fields of
+        zero width (type 1 for the first field, 0 otherwise).
+
+        All the rows are unpacked by a single struct call
+        (or by numpy, if it is available).  Fields with sizes
+        that struct doesn't have are unpacked in pieces and
+        then put back together.
+    '''
+    rowsize = sum(widths)
+    size = rowsize * count
+    if len(data) != size:
+        data = (data + '\x00' * size)[:size]
+    widths = (list(widths) + [0, 0, 0])[:3]
+    defaults = 1, 0, 0
+    if numpy is not None and count:
+        rows = numpy.frombuffer(data, numpy.uint8).reshape(count, rowsize)
+        result = []
+        start = 0
+        for width, default in zip(widths, defaults):
+            if not width:
+                result.append([default] * count)
+                continue
+            values = numpy.zeros(count, numpy.int64)
+            for column in range(start, start + width):
+                values <<= 8
+                values |= rows[:, column]
+            result.append(values.tolist())
+            start += width
+        return result
+
+    # Build the format for one row
+    fmt = []
+    pieces = []
+    for width in widths:
+        shifts = []
+        while width:
+            for code, piecesize in (('Q', 8), ('I', 4), ('H', 2), ('B', 1)):
+                if piecesize <= width:
+                    break
+            width -= piecesize
+            fmt.append(code)
+            shifts.append(8 * width)
+        pieces.append(shifts)
+    fmt = ''.join(fmt)
+    extra = rowsize - struct.calcsize('>' + fmt)
+    if extra:
+        fmt += '%dx' % extra
+    values = struct.unpack('>' + fmt * count, data)
+
+    result = []
+    index = 0
+    numpieces = len(pieces[0]) + len(pieces[1]) + len(pieces[2])
+    for shifts, default in zip(pieces, defaults):
+        if not shifts:
+            result.append([default] * count)
+            continue
+        columns = [values[index + i::numpieces] for i in range(len(shifts))]
+        index += len(shifts)
+        field = list(columns[0])
+        if len(columns) > 1:
+            field = [x << shifts[0] for x in field]
+            for column, shift in zip(columns, shifts)[1:]:
+                field = [x | (y << shift) for x, y in izip(field, column)]
+        result.append(field)
+    return result
+
+
+def isclean(obj, isinstance=isinstance, PdfDict=PdfDict,
+            PdfArray=PdfArray, dictvalues=dict.itervalues,
+            listiter=list.__iter__):
+    ''' Return True if an array or dictionary (and all the direct
+        arrays and dictionaries inside it) are unchanged.
+    '''
+    if obj.dirty:
+        return False
+    for value in (isinstance(obj, PdfDict) and dictvalues or listiter)(obj):
+        if isinstance(value, (PdfDict, PdfArray)) and not value.indirect:
+            if not isclean(value):
+                return False
+    return True
+
+
+def inuse(obj, isinstance=isinstance, PdfDict=PdfDict, PdfArray=PdfArray,
+          dictvalues=dict.itervalues, listiter=list.__iter__,
+          getrefcount=sys.getrefcount):
+    ''' Return True if any of the direct arrays and dictionaries
+        inside an array or dictionary (at any depth) are referred
+        to from anywhere else.  Something that holds on to one
+        of those could still change it, so the object that it
+        is part of must not be thrown away.
+    '''
+    for value in (isinstance(obj, PdfDict) and dictvalues or listiter)(obj):
+        if isinstance(value, (PdfDict, PdfArray)) and not value.indirect:
+            # References: the container, value, and getrefcount's argument
+            if getrefcount(value) > 3 or inuse(value):
+                return True
+    return False
+
+
+class PageList(list):
+    ''' The list of pages of a document.  Until it is changed,
+        the list is only a set of empty slots (as many as the
+        /Count of the page tree says there are), and a page is
+        found by walking down the page tree -- using the /Count
+        of each /Pages node to pick the right kid -- the first
+        time it is asked for.
+
+        Anything else (iterating, slicing, changing the list, etc.)
+        reads the whole page tree first, so the PageList acts just
+        like a regular list of pages.
+
+        If cache is False, pages are looked up every time, and
+        iterating walks the page tree once without keeping the
+        pages, so that they don't have to all be kept in memory.
+
+        readpages returns a list of the pages under a node of
+        the page tree, and iterpages yields them one at a time.
+        If ispage is given, it is called with a reference to a
+        kid that has not been read yet, and returns True if the
+        kid is certainly a /Page, so that the kid doesn't have
+        to be read just to count it.
+    '''
+
+    def __init__(self, root, readpages, iterpages, cache=True, ispage=None):
+        self.root = root
+        self.readpages = readpages
+        self.iterpages = iterpages
+        self.ispage = ispage
+        self.cache = cache
+        try:
+            count = int(root.Pages.Count)
+        except (AttributeError, TypeError, ValueError):
+            count = -1
+        if count >= 0:
+            list.__init__(self, [None] * count)
+        else:
+            self.materialize()
+
+    def materialize(self):
+        ''' Read the whole page tree into the list
+        '''
+        readpages = self.readpages
+        if readpages is not None:
+            self.readpages = None
+            list.__setitem__(self, slice(None), readpages(self.root))
+
+    def findpage(self, index, int=int, len=len, isinstance=isinstance,
+                 listget=list.__getitem__, PdfIndirect=PdfIndirect,
+                 pagename=PdfName.Page, pagesname=PdfName.Pages):
+        ''' Walk down the page tree to the given page.  Returns
+            None if the page tree doesn't match its /Count entries.
+
+            Kids are resolved one at a time, rather than all at
+            once by the PdfArray, and only if they have to be:
+            kids that ispage says are pages are just counted, so
+            the cost is mostly in the /Pages nodes on the way down.
+        '''
+        ispage = self.ispage
+        try:
+            node = self.root.Pages
+            while 1:
+                kids = node.Kids
+                for kidnum in xrange(len(kids)):
+                    kid = listget(kids, kidnum)
+                    if isinstance(kid, PdfIndirect):
+                        if index and ispage is not None and ispage(kid):
+                            index -= 1
+                            continue
+                        kid = kid.real_value()
+                    kidtype = kid.Type
+                    if kidtype == pagename:
+                        if not index:
+                            return kid
+                        index -= 1
+                    elif kidtype == pagesname:
+                        count = int(kid.Count)
+                        if index < count:
+                            node = kid
+                            break
+                        index -= count
+                    else:
+                        return None
+                else:
+                    return None
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+    def __getitem__(self, index, getitem=list.__getitem__,
+                    setitem=list.__setitem__, isinstance=isinstance):
+        if self.readpages is None:
+            return getitem(self, index)
+        if not isinstance(index, (int, long)):
+            self.materialize()
+            return getitem(self, index)
+        result = getitem(self, index)
+        if result is None:
+            if index < 0:
+                index += len(self)
+            result = self.findpage(index)
+            if result is None:
+                log.warning('Page tree does not match its /Count entries')
+                self.materialize()
+                return getitem(self, index)
+            if self.cache:
+                setitem(self, index, result)
+        return result
+
+    def __iter__(self):
+        if not self.cache and self.readpages is not None:
+            return self.iterpages(self.root)
+        self.materialize()
+        return list.__iter__(self)
+
+
+def _materialized(name):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kw):
+        self.materialize()
+        return method(self, *args, **kw)
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+for name in ('''__getslice__ __setitem__ __setslice__ __delitem__
+        __delslice__ __add__ __iadd__ __mul__ __rmul__ __imul__
+        __contains__ __reversed__ __repr__ __eq__ __ne__ __lt__
+        __le__ __gt__ __ge__ append extend insert pop remove index
+        count reverse sort''').split():
+    setattr(PageList, name, _materialized(name))
+del name
 
 
 class PdfReader(PdfDict):
@@ -23,16 +299,40 @@ class PdfReader(PdfDict):
     warned_bad_stream_start = False  # Use to keep from spewing warnings
     warned_bad_stream_end = False  # Use to keep from spewing warnings
 
-    def findindirect(self, objnum, gennum, PdfIndirect=PdfIndirect, int=int):
+    # How many decompressed object streams to keep around
+    objstm_cache_size = 16
+
+    # Approximate number of bytes of objects to keep in memory,
+    # or None to keep everything.
+    memory_budget = None
+
+    # The name of the file that was read, if there was one,
+    # and the location of its (last) cross-reference section.
+    fname = None
+    startxref = None
+
+    # A PdfStats, if statistics are being kept
+    stats = None
+
+    # How many objects can be missing or at the wrong offset
+    # before the cross-reference data is rebuilt by scanning
+    # the file, and whether that has been done.
+    rebuild_threshold = 3
+    bad_offsets = 0
+    xref_rebuilt = False
+
+    # The object offsets in order, made when first needed
+    sorted_offsets = ()
+
+    def findindirect(self, objnum, gennum, int=int):
         ''' Return a previously loaded indirect object, or create
             a placeholder for it.
         '''
         key = int(objnum), int(gennum)
         result = self.indirect_objects.get(key)
         if result is None:
-            self.indirect_objects[key] = result = PdfIndirect(key)
+            self.indirect_objects[key] = result = self.placeholder(key)
             self.deferred_objects.add(key)
-            result._loader = self.loadindirect
         return result
 
     def readarray(self, source, PdfArray=PdfArray):
@@ -56,7 +356,7 @@ class PdfReader(PdfDict):
             append(value)
         return PdfArray(result)
 
-    def readdict(self, source, PdfDict=PdfDict):
+    def readdict(self, source, PdfDict=PdfDict, setter=dict.__setitem__):
         ''' Found a << token.  Parse the tokens after that.
         '''
         specialget = self.special.get
@@ -80,7 +380,7 @@ class PdfReader(PdfDict):
                         source.exception('Expected "R" following two integers')
                     value = self.findindirect(value, tok)
                     tok = next()
-            result[key] = value
+            setter(result, key, value)
         return result
 
     def empty_obj(self, source, PdfObject=PdfObject):
@@ -123,13 +423,44 @@ class PdfReader(PdfDict):
                 self.private.warned_bad_stream_start = True
         return startstream
 
+    def recovered(self, kind, detail):
+        ''' Note a problem in the file that was worked around.
+        '''
+        stats = self.stats
+        if stats is not None:
+            stats.event(kind, detail)
+
+    def nextoffset(self, offset, default, bisect=bisect.bisect_right,
+                   len=len):
+        ''' Return the offset of the first object (or cross-reference
+            section) after offset in the file, or default if there
+            isn't one before that.  The sorted list of offsets is
+            made once, and again only if more offsets are added.
+        '''
+        offsets = self.sorted_offsets
+        all_offsets = self.source.all_offsets
+        if len(offsets) != len(all_offsets):
+            # (Duplicates are kept, so the lengths can be compared.)
+            offsets = sorted(all_offsets)
+            self.private.sorted_offsets = offsets
+        index = bisect(offsets, offset)
+        if index < len(offsets):
+            return min(offsets[index], default)
+        return default
+
     def readstream(self, obj, startstream, source,
-                   streamending='endstream endobj'.split(), int=int):
+                   streamending='endstream endobj'.split(), int=int,
+                   PdfRawData=PdfRawData, isheader=re.compile(
+                       r'\d+\s+\d+\s+obj|xref').match):
+        ''' Attach the stream to the object.  The data itself is
+            not read until somebody asks for it -- the object just
+            gets a PdfRawData reference into the source.
+        '''
         fdata = source.fdata
         length = int(obj.Length)
         source.floc = target_endstream = startstream + length
         endit = source.multiple(2)
-        obj._stream = fdata[startstream:target_endstream]
+        obj._stream = PdfRawData(fdata, startstream, length)
         if endit == streamending:
             return
 
@@ -138,24 +469,29 @@ class PdfReader(PdfDict):
 
         do_warn, self.warned_bad_stream_end = self.warned_bad_stream_end, False
 
-        # TODO:  Extract maxstream from dictionary of object offsets
-        # and use rfind instead of find.
+        # The stream should end before the next object starts,
+        # unless the offset of that object is wrong.
         maxstream = len(fdata) - 20
-        endstream = fdata.find('endstream', startstream, maxstream)
+        nextobj = self.nextoffset(startstream, maxstream)
+        endstream = fdata.rfind('endstream', startstream, nextobj)
+        if (endstream < 0 and nextobj < maxstream and
+                not isheader(fdata, nextobj)):
+            endstream = fdata.find('endstream', nextobj, maxstream)
         source.floc = startstream
         room = endstream - startstream
+        self.recovered('bad_stream_length', startstream)
         if endstream < 0:
             source.error('Could not find endstream')
             return
         if length == room + 1 and fdata[startstream - 2:startstream] == '\r\n':
             source.warning(r"stream keyword terminated by \r without \n")
-            obj._stream = fdata[startstream - 1:target_endstream - 1]
+            obj._stream = PdfRawData(fdata, startstream - 1, length)
             return
         source.floc = endstream
         if length > room:
             source.error(('stream /Length attribute (%d) appears to be too big'
                          ' (size %d) -- adjusting'), length, room)
-            obj.stream = fdata[startstream:endstream]
+            obj.stream = PdfRawData(fdata, startstream, room)
             return
         if fdata[target_endstream:endstream].rstrip():
             source.error(('stream /Length attribute (%d) might be smaller'
@@ -170,62 +506,343 @@ class PdfReader(PdfDict):
             return
         source.error('Illegal endstream/endobj combination')
 
+    def readobj(self, source, PdfRawData=PdfRawData, PdfDict=PdfDict,
+                isinstance=isinstance):
+        ''' Read an object.  If it is an array or a dictionary,
+            remember where it came from, so that it can be
+            written back out verbatim if it is not changed.
+        '''
+        obj = source.next()
+        func = self.special.get(obj)
+        if func is not None:
+            start = source.tokstart
+            obj = func(source)
+            if obj is not None:
+                # Ends with >> or ]
+                end = source.tokstart + 1 + isinstance(obj, PdfDict)
+                obj.rawdata = PdfRawData(source.fdata, start, end - start)
+        return obj
+
+    def storeobj(self, key, obj, len=len, getattr=getattr, copy=copy.copy):
+        ''' Remember an object that has just been read, and
+            return it.
+        '''
+        placeholder = self.findindirect(*key)
+        self.deferred_objects.discard(key)
+        stats = self.stats
+        if stats is not None:
+            stats.add('objects_loaded')
+        rawdata = getattr(obj, 'rawdata', None)
+        if rawdata is None:
+            # Don't mark a token that is shared with other
+            # objects (or other readers) -- use a copy.
+            obj = copy(obj)
+        if not placeholder.transient:
+            self.indirect_objects[key] = obj
+            obj.indirect = key
+            return obj
+
+        # The object remembers its placeholder, so that the writer
+        # knows it is the same object if it is read again.
+        obj.indirect = placeholder
+        if rawdata is None:
+            self.pinned_objects[key] = obj
+            return obj
+        size = len(rawdata)
+        stream = getattr(obj, '_stream', None)
+        if stream is not None:
+            size += len(stream)
+        self.cached_objects[key] = obj
+        self.cached_sizes[key] = size
+        buf = rawdata.fdata
+        if buf is not self.source.fdata:
+            # The object came out of an object stream, and keeps the
+            # whole decompressed buffer alive.  Count the buffer once,
+            # for as long as any cached object uses it.
+            bufinfo = self.cached_buffers.get(id(buf))
+            if bufinfo is None:
+                bufinfo = self.cached_buffers[id(buf)] = [0, len(buf)]
+                size += len(buf)
+            bufinfo[0] += 1
+            self.cached_bufids[key] = id(buf)
+        self.private.cached_total = self.cached_total + size
+        if self.cached_total > self.memory_budget:
+            self.evict()
+        return obj
+
+    def evict(self, getrefcount=sys.getrefcount, isclean=isclean,
+              inuse=inuse):
+        ''' Throw away the least recently used objects, until the
+            cache is comfortably inside the memory budget.  Objects
+            that something else is still using (or that have parts
+            that something else is using) are kept, and so are
+            changed objects, which are moved out of the cache and
+            kept for good.
+        '''
+        cache = self.cached_objects
+        sizes = self.cached_sizes
+        buffers = self.cached_buffers
+        bufids = self.cached_bufids
+        total = self.cached_total
+        target = self.memory_budget * 3 // 4
+        victims = []
+        for key in cache:
+            if total <= target:
+                break
+            # References: the cache, obj, and getrefcount's argument
+            obj = cache[key]
+            if getrefcount(obj) <= 3 and not inuse(obj):
+                victims.append(key)
+                total -= sizes[key]
+                bufid = bufids.get(key)
+                if bufid is not None:
+                    # The buffer goes when its last user does
+                    bufinfo = buffers[bufid]
+                    bufinfo[0] -= 1
+                    if not bufinfo[0]:
+                        total -= bufinfo[1]
+                        del buffers[bufid]
+        obj = None
+        for key in victims:
+            obj = cache.pop(key)
+            del sizes[key]
+            bufids.pop(key, None)
+            if not isclean(obj):
+                self.pinned_objects[key] = obj
+        self.private.cached_total = total
+
     def loadindirect(self, key):
         result = self.indirect_objects.get(key)
         if not isinstance(result, PdfIndirect):
             return result
+        if result.transient:
+            obj = self.cached_objects.pop(key, None)
+            if obj is not None:
+                self.cached_objects[key] = obj
+                return obj
+            obj = self.pinned_objects.get(key)
+            if obj is not None:
+                return obj
+        if key in self.missing_objects:
+            return None
         source = self.source
-        offset = int(self.source.obj_offsets.get(key, '0'))
+        offset = source.obj_offsets.get(key, 0)
+        if isinstance(offset, tuple):
+            return self.loadcompressed(key, *offset)
         if not offset:
+            if self.badoffset():
+                return self.loadindirect(key)
             log.warning("Did not find PDF object %s" % (key,))
+            self.missing_objects.add(key)
+            self.recovered('missing_object', key)
             return None
 
-        # Read the object header and validate it
-        objnum, gennum = key
-        source.floc = offset
-        objid = source.multiple(3)
-        ok = len(objid) == 3
-        ok = ok and objid[0].isdigit() and int(objid[0]) == objnum
-        ok = ok and objid[1].isdigit() and int(objid[1]) == gennum
-        ok = ok and objid[2] == 'obj'
-        if not ok:
+        try:
+            # Read the object header and validate it
+            objnum, gennum = key
             source.floc = offset
-            source.next()
-            objheader = '%d %d obj' % (objnum, gennum)
-            fdata = source.fdata
-            offset2 = (fdata.find('\n' + objheader) + 1 or
-                       fdata.find('\r' + objheader) + 1)
-            if (not offset2 or
-                    fdata.find(fdata[offset2 - 1] + objheader, offset2) > 0):
-                source.warning("Expected indirect object '%s'" % objheader)
-                return None
-            source.warning(("Indirect object %s found at incorrect" +
-                            "offset %d (expected offset %d)") %
-                           (objheader, offset2, offset))
-            source.floc = offset2 + len(objheader)
+            objid = source.multiple(3)
+            ok = len(objid) == 3
+            ok = ok and objid[0].isdigit() and int(objid[0]) == objnum
+            ok = ok and objid[1].isdigit() and int(objid[1]) == gennum
+            ok = ok and objid[2] == 'obj'
+            if not ok:
+                source.floc = offset
+                source.next()
+                self.recovered('bad_offset', key)
+                if self.badoffset():
+                    return self.loadindirect(key)
+                objheader = '%d %d obj' % (objnum, gennum)
+                fdata = source.fdata
+                offset2 = (not self.xref_rebuilt and
+                           (fdata.find('\n' + objheader) + 1 or
+                            fdata.find('\r' + objheader) + 1))
+                if (not offset2 or fdata.find(fdata[offset2 - 1] + objheader,
+                                              offset2) > 0):
+                    source.warning("Expected indirect object '%s'" % objheader)
+                    self.missing_objects.add(key)
+                    return None
+                source.warning(("Indirect object %s found at incorrect" +
+                                "offset %d (expected offset %d)") %
+                               (objheader, offset2, offset))
+                source.floc = offset2 + len(objheader)
 
-        # Read the object, and call special code if it starts
-        # an array or dictionary
-        obj = source.next()
-        func = self.special.get(obj)
-        if func is not None:
-            obj = func(source)
+            # Read the object, and call special code if it starts
+            # an array or dictionary
+            obj = self.readobj(source)
 
-        self.indirect_objects[key] = obj
-        self.deferred_objects.remove(key)
+            # Add the stream if there is one, then
+            # remember the object and mark it as indirect.
+            tok = source.next()
+            if tok != 'endobj':
+                self.readstream(obj, self.findstream(obj, tok, source), source)
+        except StopIteration:
+            # The file ends in the middle of the object
+            log.warning('PDF object %s is cut off by the end of the file'
+                        % (key,))
+            self.restartsource()
+            self.missing_objects.add(key)
+            self.recovered('missing_object', key)
+            return None
+        return self.storeobj(key, obj)
 
-        # Mark the object as indirect, and
-        # add it to the list of streams if it starts a stream
-        obj.indirect = key
-        tok = source.next()
-        if tok != 'endobj':
-            self.readstream(obj, self.findstream(obj, tok, source), source)
-        return obj
+    def restartsource(self):
+        ''' A tokenizer can't be used again once it has run off
+            the end of the data, so replace the source with a new
+            one that has the same cross-reference data.
+        '''
+        old = self.source
+        self.private.source = source = PdfTokens(old.fdata, 0, True,
+                                                 self.token_pool)
+        source.obj_offsets = old.obj_offsets
+        source.all_offsets = old.all_offsets
+        return source
 
-    def findxref(fdata):
+    def badoffset(self):
+        ''' Called when an object is missing from the cross-reference
+            data, or isn't where it says.  Rebuilds the cross-reference
+            data if that has happened too often, and returns True if
+            it did.
+        '''
+        if self.xref_rebuilt:
+            return False
+        private = self.private
+        private.bad_offsets = self.bad_offsets + 1
+        if self.bad_offsets < self.rebuild_threshold:
+            return False
+        log.warning('Too many bad object offsets -- '
+                    'rebuilding cross-reference data')
+        self.rebuildxref(self.source)
+        return True
+
+    def findobjstm(self, stmnum):
+        ''' Return a copy of an object stream, which can be
+            decompressed without changing the object stream
+            itself, or None if there is no such object stream.
+        '''
+        obj = self.findindirect(stmnum, 0)
+        if isinstance(obj, PdfIndirect):
+            obj = obj.real_value()
+        if obj is None or obj.Type != '/ObjStm':
+            log.error('Object stream %s not found' % stmnum)
+            return None
+        return PdfDict(obj)
+
+    def readobjstm(self, stmnum, obj=None):
+        ''' Return a tokenizer for the decompressed data of an
+            object stream, along with the list of (object number,
+            offset) pairs from its header.  The most recently used
+            object streams are cached.  If the object stream has
+            already been copied and decompressed, it can be passed
+            in as obj.
+        '''
+        cache = self.objstm_cache
+        result = cache.pop(stmnum, None)
+        if result is None:
+            if obj is None:
+                obj = self.findobjstm(stmnum)
+                if obj is None:
+                    return None
+                uncompress([obj], stats=self.stats)
+            objsource = PdfTokens(obj.stream, 0, False, self.token_pool)
+            snext = objsource.next
+            offsets = []
+            firstoffset = int(obj.First)
+            num = snext()
+            while num.isdigit():
+                offsets.append((int(num), firstoffset + int(snext())))
+                num = snext()
+            result = objsource, offsets
+            while len(cache) >= self.objstm_cache_size:
+                cache.popitem(last=False)
+        cache[stmnum] = result
+        return result
+
+    def loaded(self, key):
+        ''' Return the object for a key, if it has already been
+            read (and hasn't been thrown away since), without
+            reading it.
+        '''
+        obj = self.indirect_objects.get(key)
+        if not isinstance(obj, PdfIndirect):
+            return obj
+        if obj.transient:
+            obj = self.cached_objects.get(key)
+            if obj is None:
+                obj = self.pinned_objects.get(key)
+            return obj
+
+    def ispage(self, key, search=re.compile(
+            r'/Type\s*/Page(s?)(?![^\s/<>\[\]()%{}])').finditer):
+        ''' Return True if the object for a key is certainly a
+            /Page, judging by its source data, without reading
+            it.  (Returns False if it might not be.)
+        '''
+        obj = self.loaded(key)
+        if obj is not None:
+            return obj.Type == PdfName.Page
+        source = self.source
+        offset = source.obj_offsets.get(key)
+        if isinstance(offset, tuple):
+            info = self.readobjstm(offset[0])
+            if info is None:
+                return False
+            objsource, offsets = info
+            index = offset[1]
+            if index >= len(offsets) or offsets[index][0] != key[0]:
+                return False
+            fdata = objsource.fdata
+            start = offsets[index][1]
+            end = (index + 1 < len(offsets) and offsets[index + 1][1] or
+                   len(fdata))
+        elif offset:
+            fdata = source.fdata
+            start = offset
+            end = self.nextoffset(offset, len(fdata))
+        else:
+            return False
+        # /Type /Page, and no /Type /Pages
+        found = [x.group(1) for x in search(fdata, start, end)]
+        return bool(found) and not max(found)
+
+    def loaded_objects(self):
+        ''' Return a list of all the objects that have been
+            read (and haven't been thrown away since).
+        '''
+        if self.memory_budget is None:
+            return [obj for obj in self.indirect_objects.itervalues()
+                    if not isinstance(obj, PdfIndirect)]
+        return self.cached_objects.values() + self.pinned_objects.values()
+
+    def loadcompressed(self, key, stmnum, index):
+        ''' Load an object that lives inside an object stream
+        '''
+        info = self.readobjstm(stmnum)
+        if info is None:
+            self.missing_objects.add(key)
+            return None
+        objsource, offsets = info
+        objnum = key[0]
+        if index >= len(offsets) or offsets[index][0] != objnum:
+            # Bad index -- look for the object number instead
+            for index, (num, offset) in enumerate(offsets):
+                if num == objnum:
+                    break
+            else:
+                log.warning('Did not find PDF object %s in object stream %s'
+                            % (key, stmnum))
+                self.missing_objects.add(key)
+                return None
+        objsource.floc = offsets[index][1]
+        obj = self.readobj(objsource)
+        return self.storeobj(key, obj)
+
+    def findxref(fdata, endloc=None, pool=None):
         ''' Find the cross reference section at the end of a file
         '''
-        startloc = fdata.rfind('startxref')
+        if endloc is None:
+            endloc = len(fdata)
+        startloc = fdata.rfind('startxref', 0, endloc)
         if startloc < 0:
             raise PdfParseError('Did not find "startxref" at end of file')
         source = PdfTokens(fdata, startloc, False)
@@ -236,7 +853,7 @@ class PdfReader(PdfDict):
             source.exception('Expected table location')
         if source.next_default().rstrip().lstrip('%') != 'EOF':
             source.exception('Expected %%EOF')
-        return startloc, PdfTokens(fdata, int(tableloc), True)
+        return startloc, PdfTokens(fdata, int(tableloc), True, pool)
     findxref = staticmethod(findxref)
 
     def parsexref(self, source, int=int, range=range):
@@ -251,13 +868,6 @@ class PdfReader(PdfDict):
                 if (i + 1) >= len(array):
                     break
 
-        def convert_to_int(d, size):
-            if size > 8:
-                source.exception('Invalid size in convert_to_int')
-            d = '\x00\x00\x00\x00\x00\x00\x00\x00' + d
-            d = d[-8:]
-            return struct.unpack('>q', d)[0]
-
         def read_trailer():
             tok = next()
             if tok != '<<':
@@ -281,44 +891,32 @@ class PdfReader(PdfDict):
                 tok = next()
                 end = source.floc + int(obj.Length)
                 self.readstream(obj, self.findstream(obj, tok, source), source)
-                uncompress([obj])
+                uncompress([obj], stats=self.stats)
                 num_pairs = obj.Index or PdfArray(['0', obj.Size])
+                num_pairs = list(_pairs(num_pairs))
                 entry_sizes = [int(x) for x in obj.W]
-                object_streams = {}
-                for num, size in _pairs(num_pairs):
-                    cnt = 0
-                    stream_offset = 0
-                    while cnt < size:
-                        for i in range(len(entry_sizes)):
-                            d = obj.stream[stream_offset:stream_offset +
-                                                         entry_sizes[i]]
-                            stream_offset += entry_sizes[i]
-                            di = convert_to_int(d, entry_sizes[i])
-                            if i == 0:
-                                xref_type = di
-                                if xref_type == 0 and entry_sizes[0] == 0:
-                                    xref_type = 1
-                            elif i == 1:
-                                if xref_type == 1:
-                                    offset = di
-                                elif xref_type == 2:
-                                    objnum = di
-                            elif i == 2:
-                                if xref_type == 1:
-                                    generation = di
-                                elif xref_type == 2:
-                                    obstr_idx = di
-                        if xref_type == 1 and offset != 0:
-                            setdefault((num, generation), offset)
-                            add_offset(offset)
+                if max(entry_sizes) > 8:
+                    source.exception('Invalid size in xref stream /W')
+                count = sum(size for num, size in num_pairs)
+                xref_types, fields2, fields3 = decode_xref(
+                    obj.stream, entry_sizes, count)
+                index = 0
+                for num, size in num_pairs:
+                    end_index = index + size
+                    for num, xref_type, field2, field3 in izip(
+                            xrange(num, num + size),
+                            xref_types[index:end_index],
+                            fields2[index:end_index],
+                            fields3[index:end_index]):
+                        if xref_type == 1:
+                            if field2 != 0:
+                                setdefault((num, field3), field2)
+                                add_offset(field2)
                         elif xref_type == 2:
-                            if not objnum in object_streams:
-                                object_streams[objnum] = []
-                            object_streams[objnum].append(obstr_idx)
-                        cnt += 1
-                        num += 1
-
-                self.load_stream_objects(object_streams)
+                            # Compressed -- remember the object stream
+                            # and the index of the object inside it.
+                            setdefault((num, 0), (field2, field3))
+                    index = end_index
 
                 source.floc = end
                 endit = source.multiple(2)
@@ -352,7 +950,9 @@ class PdfReader(PdfDict):
             try:
                 # Table formatted incorrectly.
                 # See if we can figure it out anyway.
-                end = source.fdata.rindex('trailer', start)
+                end = source.fdata.rfind('trailer', start)
+                if end < 0:
+                    raise ValueError
                 table = source.fdata[start:end].splitlines()
                 for line in table:
                     tokens = line.split()
@@ -370,6 +970,7 @@ class PdfReader(PdfDict):
                                   repr(line))
                         raise ValueError
                 log.warning('Badly formatted xref table')
+                self.recovered('bad_xref_table', start)
                 source.floc = end
                 next()
             except:
@@ -380,7 +981,11 @@ class PdfReader(PdfDict):
         else:
             source.exception('Expected "xref" keyword or xref stream object')
 
-    def readpages(self, node):
+    def pagenodes(self, node):
+        ''' Yield the pages under a node of the page tree, in
+            order.  Raises AttributeError or TypeError if the
+            page tree is invalid.
+        '''
         pagename = PdfName.Page
         pagesname = PdfName.Pages
         catalogname = PdfName.Catalog
@@ -403,14 +1008,190 @@ class PdfReader(PdfDict):
             else:
                 log.error('Expected /Page or /Pages dictionary, got %s' %
                     repr(node))
+        return readnode(node)
+
+    def readpages(self, node):
         try:
-            return list(readnode(node))
+            return list(self.pagenodes(node))
         except (AttributeError, TypeError), s:
             log.error('Invalid page tree: %s' % s)
             return []
 
+    def iterpages(self, node):
+        ''' Yield the pages under a node of the page tree one
+            at a time, without keeping them anywhere.
+        '''
+        try:
+            for node in self.pagenodes(node):
+                yield node
+        except (AttributeError, TypeError), s:
+            log.error('Invalid page tree: %s' % s)
+
+    def mapfile(f, fstat=os.fstat, mapfile=mapfile):
+        ''' Memory-map an open file for reading.  (mmap cannot
+            map an empty file, so just return an empty string.)
+        '''
+        fileno = f.fileno()
+        if not fstat(fileno).st_size:
+            return ''
+        return mapfile(fileno, 0, access=ACCESS_READ)
+    mapfile = staticmethod(mapfile)
+
+    def readxref(self, source):
+        ''' Read all the cross-reference sections, following the
+            /Prev chain, and return the merged trailer.
+        '''
+        xref_list = []
+        source.all_offsets = []
+        while 1:
+            source.obj_offsets = {}
+            source.all_offsets.append(source.floc)
+
+            # Loop through all the cross-reference tables/streams
+            trailer = self.parsexref(source)
+
+            # Loop if any previously-written xrefs.
+            prev = trailer.Prev
+            if prev is None:
+                token = source.next()
+                if token != 'startxref':
+                    source.warning('Expected "startxref" at end of xref table')
+                break
+            if not xref_list:
+                trailer.Prev = None
+                original_trailer = trailer
+            source.floc = int(prev)
+            xref_list.append(source.obj_offsets)
+
+        if xref_list:
+            for update in reversed(xref_list):
+                source.obj_offsets.update(update)
+            trailer.update(original_trailer)
+        return trailer
+
+    def rebuildxref(self, source, findall=re.compile(r'''
+            (?P<obj>(?<![0-9])(?P<num>[0-9]{1,10})[\x00\t\n\f\r\ ]+
+                (?P<gen>[0-9]{1,5})[\x00\t\n\f\r\ ]+obj(?![A-Za-z0-9]))
+            | (?P<endstream>endstream)
+            | (?P<stream>stream(?=[\r\n]))
+            | (?P<trailer>trailer(?=[\x00\t\n\f\r\ <]))
+            | /Type[\x00\t\n\f\r\ ]*/(?P<type>Catalog|XRef|ObjStm)
+                (?![A-Za-z0-9])
+            ''', re.VERBOSE).finditer, findcatalog=re.compile(
+            r'/Type[\x00\t\n\f\r\ ]*/Catalog(?![A-Za-z0-9])').finditer,
+            int=int):
+        ''' Rebuild the cross-reference data from a single scan of
+            the whole file for object headers (skipping the data
+            in streams), and return a trailer for the file.
+
+            Offsets found by the scan replace the ones from the
+            cross-reference data; if an object is defined more
+            than once, the last definition is used.  Objects in
+            object streams are found by reading the object streams.
+            The trailer is made from the trailer dictionaries and
+            cross-reference streams in the file, or, failing that,
+            from the last document catalog found.
+        '''
+        private = self.private
+        private.xref_rebuilt = True
+        self.recovered('xref_rebuilt', None)
+        # (A tokenizer that has hit a parse error can't be used again.)
+        fdata = source.fdata
+        obj_offsets = getattr(source, 'obj_offsets', None) or {}
+        private.source = source = PdfTokens(fdata, 0, True, self.token_pool)
+        offsets = {}
+        headers = []
+        trailers = []
+        found = {}
+        key = None
+        instream = False
+        for match in findall(fdata):
+            kind = match.lastgroup
+            if kind == 'endstream':
+                instream = False
+            elif instream:
+                continue
+            elif kind == 'obj':
+                offset = match.start()
+                key = int(match.group('num')), int(match.group('gen'))
+                offsets[key] = offset
+                headers.append(offset)
+            elif kind == 'stream':
+                instream = True
+            elif kind == 'trailer':
+                trailers.append(match.end())
+            elif key is not None:
+                found.setdefault(match.group('type'), []).append(key)
+
+        obj_offsets.update(offsets)
+        source.obj_offsets = obj_offsets
+        source.all_offsets = headers
+        self.private.sorted_offsets = ()
+        self.missing_objects.clear()
+        self.objstm_cache.clear()
+
+        for stmkey in found.get('ObjStm', ()):
+            try:
+                info = self.readobjstm(stmkey[0])
+            except Exception:
+                info = None
+            if info is None:
+                continue
+            objsource, stmoffsets = info
+            for index, (num, offset) in enumerate(stmoffsets):
+                if (num, 0) not in offsets:
+                    obj_offsets[num, 0] = stmkey[0], index
+            # The catalog is usually in an object stream, if there are any.
+            for match in findcatalog(objsource.fdata):
+                pos = match.start()
+                before = [x for x in stmoffsets if x[1] <= pos]
+                if before:
+                    found.setdefault('Catalog', []).append((max(before,
+                                                    key=lambda x: x[1])[0], 0))
+
+        # XRef streams have the trailer entries in their dictionaries.
+        trailers = [(x, False) for x in trailers]
+        trailers += [(offsets[x], True) for x in found.get('XRef', ())
+                     if x in offsets]
+        trailers.sort()
+        trailer = PdfDict()
+        for offset, isobj in trailers:
+            tsource = PdfTokens(fdata, offset, True, self.token_pool)
+            try:
+                if isobj:
+                    tsource.multiple(3)
+                if tsource.next() == '<<':
+                    trailer.update(self.readdict(tsource))
+            except (PdfParseError, StopIteration):
+                pass
+        if trailer.Root is None and 'Catalog' in found:
+            trailer.Root = self.findindirect(*found['Catalog'][-1])
+        size = max([x[0] for x in obj_offsets] + [0]) + 1
+        trailer.Size = PdfObject(max(size, int(trailer.Size or 0)))
+        trailer.Prev = None
+        return trailer
+
+    def readxrefcache(self, source, info):
+        ''' Set up the cross-reference information from the
+            on-disk cache, and return the trailer.
+        '''
+        source.obj_offsets = info['obj_offsets']
+        source.all_offsets = info['all_offsets']
+        # The location of the cross-reference data that the cache
+        # was made from, or None if it had to be rebuilt.
+        private = self.private
+        private.startxref = startxref = info['startxref']
+        private.xref_rebuilt = startxref is None
+        tsource = PdfTokens(info['trailer'], pool=self.token_pool)
+        if tsource.next() != '<<':
+            tsource.exception('Expected "<<" starting cached trailer')
+        return self.readdict(tsource)
+
     def __init__(self, fname=None, fdata=None, decompress=False,
-                 disable_gc=True):
+                 disable_gc=True, mmap=False, xref_cache=None,
+                 memory_budget=None, token_pool=None, stats=None):
+
+        PdfDict.__init__(self)
 
         # Runs a lot faster with GC off.
         disable_gc = disable_gc and gc.isenabled()
@@ -421,23 +1202,38 @@ class PdfReader(PdfDict):
                 assert fdata is None
                 # Allow reading preexisting streams like pyPdf
                 if hasattr(fname, 'read'):
-                    fdata = fname.read()
+                    if mmap:
+                        fdata = self.mapfile(fname)
+                    else:
+                        fdata = fname.read()
                 else:
                     try:
                         f = open(fname, 'rb')
-                        fdata = f.read()
-                        f.close()
-                    except IOError:
+                        try:
+                            if mmap:
+                                fdata = self.mapfile(f)
+                            else:
+                                fdata = f.read()
+                        finally:
+                            f.close()
+                    except EnvironmentError:
                         raise PdfParseError('Could not read PDF file %s' %
                             fname)
 
             assert fdata is not None
-            if not fdata.startswith('%PDF-'):
+
+            # A memory-mapped file (or any other non-string buffer)
+            # is never copied as a whole -- only the pieces we
+            # actually look at are sliced out of it.
+            mapped = not isinstance(fdata, str)
+
+            if fdata[:5] != '%PDF-':
                 startloc = fdata.find('%PDF-')
                 if startloc >= 0:
                     log.warning('PDF header not at beginning of file')
                 else:
-                    lines = fdata.lstrip().splitlines()
+                    lines = fdata[:mapped and 4096 or len(fdata)]
+                    lines = lines.lstrip().splitlines()
                     if not lines:
                         raise PdfParseError('Empty PDF file!')
                     raise PdfParseError('Invalid PDF header: %s' %
@@ -447,17 +1243,45 @@ class PdfReader(PdfDict):
 
             endloc = fdata.rfind('%EOF')
             if endloc < 0:
-                raise PdfParseError('EOF mark not found: %s' %
-                    repr(fdata[-20:]))
-            endloc += 6
+                # Probably truncated -- the cross-reference
+                # data will have to be rebuilt.
+                log.warning('EOF mark not found: %s' % repr(fdata[-20:]))
+                endloc = len(fdata)
+            else:
+                endloc += 6
             junk = fdata[endloc:]
-            fdata = fdata[:endloc]
+            if not mapped:
+                fdata = fdata[:endloc]
             if junk.rstrip('\00').strip():
                 log.warning('Extra data at end of file')
 
             private = self.private
             private.indirect_objects = {}
             private.deferred_objects = set()
+            private.missing_objects = set()
+            private.objstm_cache = OrderedDict()
+            if memory_budget is not None:
+                private.memory_budget = memory_budget
+                private.cached_objects = OrderedDict()
+                private.cached_sizes = {}
+                private.cached_total = 0
+                private.cached_buffers = {}
+                private.cached_bufids = {}
+                private.pinned_objects = {}
+
+            # Keep statistics, if asked to.
+            if stats is not None:
+                if stats is True:
+                    stats = PdfStats()
+                private.stats = stats
+                private.loadindirect = stats.timed('load', self.loadindirect)
+                xrefstart = time.time()
+
+            # Placeholders for objects that haven't been read yet
+            # are all of a class that knows how to read them.
+            private.placeholder = type('PdfIndirect', (PdfIndirect,), dict(
+                __slots__=(), _loader=staticmethod(self.loadindirect),
+                transient=memory_budget is not None))
             private.special = {'<<': self.readdict,
                                '[': self.readarray,
                                'endobj': self.empty_obj,
@@ -465,37 +1289,61 @@ class PdfReader(PdfDict):
             for tok in r'\ ( ) < > { } ] >> %'.split():
                 self.special[tok] = self.badtoken
 
-            startloc, source = self.findxref(fdata)
-            private.source = source
-            xref_list = []
-            source.all_offsets = []
-            while 1:
-                source.obj_offsets = {}
-
-                # Loop through all the cross-reference tables/streams
-                trailer = self.parsexref(source)
+            # Names and small integers can come from a pool
+            # shared with other readers.
+            if token_pool is True:
+                token_pool = shared_pool
+            private.token_pool = token_pool
 
-                # Loop if any previously-written xrefs.
-                prev = trailer.Prev
-                if prev is None:
-                    token = source.next()
-                    if token != 'startxref':
-                        source.warning('Expected "startxref" at end of xref table')
-                    break
-                if not xref_list:
-                    trailer.Prev = None
-                    original_trailer = trailer
-                source.floc = int(prev)
-                xref_list.append(source.obj_offsets)
+            try:
+                startloc, source = self.findxref(fdata, endloc, token_pool)
+            except PdfParseError, s:
+                log.warning('%s -- rebuilding cross-reference data' % s)
+                source = PdfTokens(fdata, 0, True, token_pool)
+                source.obj_offsets = None
+            else:
+                private.startxref = source.floc
+            private.source = source
+            if isinstance(fname, basestring):
+                private.fname = fname
 
-            if xref_list:
-                for update in reversed(xref_list):
-                    source.obj_offsets.update(update)
-                trailer.update(original_trailer)
+            # The cross-reference information can come from a cache,
+            # if we were given a file name and a cache location.
+            info = None
+            if xref_cache and isinstance(fname, basestring):
+                cachefile = xrefcache.cachefile(fname, xref_cache)
+                cachekey = xrefcache.cachekey(fname, fdata, endloc)
+                info = xrefcache.load(cachefile, cachekey)
+            if info is not None:
+                trailer = self.readxrefcache(source, info)
+            else:
+                trailer = None
+                if self.startxref is not None:
+                    try:
+                        trailer = self.readxref(source)
+                    except Exception, s:
+                        log.warning('%s -- rebuilding cross-reference data'
+                                    % (str(s) or repr(s)))
+                if trailer is None or trailer.Root is None:
+                    private.startxref = None
+                    trailer = self.rebuildxref(source)
+                    source = self.source
+                    if trailer.Root is None:
+                        raise PdfParseError('Could not find the document'
+                                            ' catalog')
+                if xref_cache and isinstance(fname, basestring):
+                    info = dict(obj_offsets=source.obj_offsets,
+                                all_offsets=source.all_offsets,
+                                startxref=self.startxref,
+                                trailer=xrefcache.format_trailer(trailer))
+                    xrefcache.save(cachefile, cachekey, info)
 
             if trailer.Version and \
                     float(trailer.Version) > float(self.version):
                 self.version = trailer.Version
+            private.xref_size = int(trailer.Size or 0)
+            if stats is not None:
+                stats.addtime('xref', time.time() - xrefstart)
 
             trailer = PdfDict(
                 Root=trailer.Root,
@@ -506,51 +1354,60 @@ class PdfReader(PdfDict):
             self.update(trailer)
 
             #self.read_all_indirect(source)
-            private.pages = self.readpages(self.Root)
+            private.pages = PageList(self.Root, self.readpages,
+                                     self.iterpages, memory_budget is None,
+                                     self.ispage)
             if decompress:
                 self.uncompress()
         finally:
             if disable_gc:
                 gc.enable()
 
-    def load_stream_objects(self, object_streams):
-        # read object streams
-        objs = []
-        for num in object_streams.iterkeys():
-            obj = self.findindirect(num, 0).real_value()
-            assert obj.Type == '/ObjStm'
-            objs.append(obj)
-
-        # read objects from stream
-        if objs:
-            uncompress(objs)
-            for obj in objs:
-                objsource = PdfTokens(obj.stream, 0, False)
-                snext = objsource.next
-                offsets = {}
-                firstoffset = int(obj.First)
-                num = snext()
-                while num.isdigit():
-                    offset = int(snext())
-                    offsets[int(num)] = firstoffset + offset
-                    num = snext()
-                for num, offset in offsets.iteritems():
-                    # Read the object, and call special code if it starts
-                    # an array or dictionary
-                    objsource.floc = offset
-                    sobj = snext()
-                    func = self.special.get(sobj)
-                    if func is not None:
-                        sobj = func(objsource)
-
-                    key = (num, 0)
-                    self.indirect_objects[key] = sobj
-                    if key in self.deferred_objects:
-                        self.deferred_objects.remove(key)
-
-                    # Mark the object as indirect, and
-                    # add it to the list of streams if it starts a stream
-                    sobj.indirect = key
+    def load_stream_objects(self, object_streams, workers=None):
+        ''' Read all the objects in the given object streams
+            (an iterable of object stream numbers), rather than
+            waiting for them to be asked for.  Objects that have
+            been replaced by later updates to the file are skipped.
+
+            If workers is more than 1, the object streams are
+            decompressed a batch at a time, by that many threads.
+        '''
+        obj_offsets = self.source.obj_offsets
+        object_streams = list(object_streams)
+        pool = workerpool(workers, object_streams)
+        batchsize = max(self.objstm_cache_size, workers or 1)
+        try:
+            for start in xrange(0, len(object_streams), batchsize):
+                self._load_batch(object_streams[start:start + batchsize],
+                                 obj_offsets, pool)
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+    def _load_batch(self, batch, obj_offsets, pool):
+        ''' Load the objects in a batch of object streams for
+            load_stream_objects.
+        '''
+        copies = {}
+        if pool is not None:
+            cache = self.objstm_cache
+            for stmnum in batch:
+                if stmnum not in cache:
+                    copies[stmnum] = self.findobjstm(stmnum)
+            uncompress([x for x in copies.itervalues() if x is not None],
+                       pool=pool, stats=self.stats)
+        for stmnum in batch:
+            obj = copies.get(stmnum)
+            if obj is None and stmnum in copies:
+                continue
+            info = self.readobjstm(stmnum, obj)
+            if info is None:
+                continue
+            for index, (num, offset) in enumerate(info[1]):
+                if obj_offsets.get((num, 0)) == (stmnum, index):
+                    obj = self.findindirect(num, 0)
+                    if isinstance(obj, PdfIndirect):
+                        obj.real_value()
 
     def read_all(self):
         deferred = self.deferred_objects
@@ -574,6 +1431,14 @@ class PdfReader(PdfDict):
             for key in new:
                 self.loadindirect(key)
 
-    def uncompress(self):
+    def uncompress(self, workers=None):
+        ''' Decompress all the streams in the file, using
+            workers threads if workers is more than 1.
+        '''
         self.read_all()
-        uncompress(self.indirect_objects.itervalues())
+        objects = self.indirect_objects.itervalues()
+        if self.memory_budget is not None:
+            # (Decompressed objects are changed, so they are
+            # all kept in memory.)
+            objects = (obj.real_value() for obj in objects)
+        uncompress(objects, workers=workers, stats=self.stats)
@@ -16,45 +16,331 @@ and
 
 addpage() assumes that the pages are part of a valid
 tree/forest of PDF objects.
+
+Arrays and dictionaries that were read from a file and have
+not been changed since are copied from the source data as-is,
+with only the object numbers in their references replaced.
+
+A PdfWriter created with streaming=True writes each indirect
+object to the file as soon as it has been formatted, rather
+than formatting them all first, so the memory needed beyond the
+object graph itself is small, no matter how big the output is.
+
+write_incremental() appends an update to a file that was read
+by a PdfReader, rather than writing a whole new file.  Only the
+objects that were changed or added are written, along with a new
+cross-reference section.
+
+A PdfWriter created with object_streams=True packs the objects
+that aren't streams into compressed object streams, and writes a
+compressed cross-reference stream instead of a cross-reference
+table.  (This needs PDF 1.5, so the version is raised if need be.)
+
+compress can be a CompressionPolicy (from pdfrw.compress) rather
+than True, to choose zlib levels for different kinds of stream,
+skip small streams, or compress already compressed streams again.
+
+If compress is set, a PdfWriter created with workers=N finds all
+the streams to be compressed before it formats anything, and
+compresses them with N threads.  The output is just the same.
+
+A PdfWriter created with dedup=True looks for indirect objects
+that have exactly the same contents (fonts, images and so on that
+several source files each have a copy of), and only writes one
+of each.  How many were dropped, and roughly how many bytes that
+saved, are left in dedup_count and dedup_saved.
+
+A PdfWriter created with stats (a PdfStats from pdfrw.stats, or
+True) records the time spent compressing, formatting and writing,
+and the numbers of streams and objects, in its stats attribute.
 '''
 
+import hashlib
+import itertools
+import os
+import re
+import time
+import zlib
+
 try:
     set
 except NameError:
     from sets import Set as set
 
 from pdfrw.objects import PdfName, PdfArray, PdfDict, IndirectPdfDict
-from pdfrw.objects import PdfObject, PdfString
+from pdfrw.objects import PdfObject, PdfString, PdfRawData, PdfIndirect
 from pdfrw.compress import compress as do_compress
+from pdfrw.compress import CompressionPolicy, defaultpolicy
 from pdfrw.errors import PdfOutputError, log
+from pdfrw.pdfreader import isclean
+from pdfrw.stats import PdfStats
 
 NullObject = PdfObject('null')
 NullObject.indirect = True
 NullObject.Type = 'Null object'
 
+# An "objnum gennum R" reference that isn't part of a bigger token
+findrefs = re.compile(r'(?<![^\x00\t\n\f\r ()<>\[\]{}%])'
+                      r'(\d+)[\x00\t\n\f\r ]+(\d+)[\x00\t\n\f\r ]+R'
+                      r'(?![^\x00\t\n\f\r ()<>\[\]{}/%])').finditer
+
+
+def rawrefs(obj, refs, isinstance=isinstance, getattr=getattr,
+            tuple=tuple, PdfIndirect=PdfIndirect, PdfDict=PdfDict,
+            PdfArray=PdfArray, dictvalues=dict.itervalues,
+            listiter=list.__iter__):
+    ''' Gather the references to indirect objects inside
+        an array or dictionary that was read from a file,
+        counting how many times each key is used.
+        Returns False if the object or any direct object
+        inside it has been changed since it was read.
+    '''
+    if obj.dirty:
+        return False
+    isdict = isinstance(obj, PdfDict)
+    for value in (isdict and dictvalues or listiter)(obj):
+        if isinstance(value, PdfIndirect):
+            key = value
+        else:
+            key = getattr(value, 'indirect', False)
+            if not key:
+                if isinstance(value, (PdfDict, PdfArray)):
+                    if not rawrefs(value, refs):
+                        return False
+                continue
+            if not isinstance(key, tuple):
+                return False
+        info = refs.get(key)
+        if info is None:
+            refs[key] = [1, value]
+        else:
+            info[0] += 1
+    return True
+
+
+def xrefsections(entries):
+    ''' Split a sorted list of cross-reference entries (each
+        one starting with its object number) into runs of
+        consecutive object numbers, and yield the first object
+        number and the entries of each run.
+    '''
+    start = 0
+    while start < len(entries):
+        end = start + 1
+        while end < len(entries) and \
+                entries[end][0] == entries[end - 1][0] + 1:
+            end += 1
+        yield entries[start][0], entries[start:end]
+        start = end
+
+
+def findstreams(trailer, killobj, isinstance=isinstance, id=id,
+                PdfDict=PdfDict, PdfArray=PdfArray, PdfIndirect=PdfIndirect):
+    ''' Return a list of the streams that can be reached from
+        the trailer, without going through the objects in killobj
+        (which the writer replaces with others).
+    '''
+    streams = []
+    visited = set(killobj)
+    stack = [trailer]
+    while stack:
+        obj = stack.pop()
+        indirect = obj.indirect
+        objid = id(isinstance(indirect, PdfIndirect) and indirect or obj)
+        if objid in visited:
+            continue
+        visited.add(objid)
+        if isinstance(obj, PdfDict):
+            if obj._stream is not None:
+                streams.append(obj)
+            values = obj.itervalues()
+        else:
+            values = iter(obj)
+        stack.extend([x for x in values if isinstance(x, (PdfDict, PdfArray))])
+    return streams
+
+
+def finddups(trailer, killobj, isinstance=isinstance, id=id, len=len,
+             getattr=getattr, sorted=sorted, sha1=hashlib.sha1,
+             PdfDict=PdfDict, PdfIndirect=PdfIndirect, PdfRawData=PdfRawData,
+             pagetypes=(PdfName.Page, PdfName.Pages)):
+    ''' Find the indirect objects that can be reached from the
+        trailer (without going through the objects in killobj)
+        that have the same contents as an earlier one.  The
+        contents of an object include the contents (not the
+        identity) of the indirect objects it refers to, so
+        duplicates are found from the bottom up.
+
+        Pages and page tree nodes are never treated as duplicates,
+        and neither is anything that is part of a reference loop,
+        or that refers to something that is.  (Merging those could
+        make two references to one object out of references to
+        different ones.)
+
+        Returns a dictionary mapping the id of each duplicate to
+        the object it duplicates, and one mapping the id of each
+        of those objects to its number of duplicates.
+    '''
+
+    def getid(obj):
+        ''' The same id that the writer uses for the object.
+        '''
+        indirect = getattr(obj, 'indirect', False)
+        return id(isinstance(indirect, PdfIndirect) and indirect or obj)
+
+    def token(value, pieces, pending):
+        ''' Describe a value inside an object.  Indirect objects
+            that haven't been looked at yet are added to pending.
+        '''
+        if isinstance(value, PdfDict):
+            indirect = value.indirect or value._stream is not None
+        else:
+            indirect = getattr(value, 'indirect', False)
+        if not indirect:
+            describe(value, pieces, pending)
+            return
+        valueid = getid(value)
+        digest = digests.get(valueid)
+        if digest is None:
+            if valueid not in active and valueid not in skip:
+                pending.append(value)
+                return
+            # A loop -- make sure nothing matches this.
+            digest = 'loop %d' % loopcount()
+        pieces.append(digest)
+
+    def describe(obj, pieces, pending):
+        ''' Describe the contents of an object.
+        '''
+        if isinstance(obj, dict):
+            pieces.append('<<')
+            for key, value in sorted(obj.iteritems()):
+                pieces.append(key)
+                token(value, pieces, pending)
+            stream = getattr(obj, '_stream', None)
+            if stream is not None:
+                if isinstance(stream, PdfRawData):
+                    stream = stream.buffer()
+                pieces.append('stream %s' % sha1(stream).hexdigest())
+            pieces.append('>>')
+        elif isinstance(obj, (list, tuple)):
+            pieces.append('[')
+            for value in obj:
+                token(value, pieces, pending)
+            pieces.append(']')
+        else:
+            pieces.append('%s %s' % (type(obj).__name__,
+                                     getattr(obj, 'encoded', obj)))
+
+    loopcount = itertools.count().next
+    digests = {}
+    active = set()
+    skip = set(killobj)
+    first = {}
+    dups = {}
+    counts = {}
+    stack = [trailer]
+    while stack:
+        obj = stack[-1]
+        objid = getid(obj)
+        if objid in digests:
+            stack.pop()
+            continue
+        pieces = []
+        pending = []
+        describe(obj, pieces, pending)
+        if pending:
+            # Do the objects this one refers to first.
+            active.add(objid)
+            stack.extend(pending)
+            continue
+        stack.pop()
+        active.discard(objid)
+        digest = ''.join(['%d:%s' % (len(x), x) for x in pieces])
+        digests[objid] = digest = sha1(digest).hexdigest()
+        if obj is trailer or (isinstance(obj, PdfDict) and
+                              obj.Type in pagetypes):
+            continue
+        original = first.setdefault(digest, obj)
+        if original is not obj:
+            dups[objid] = original
+            originalid = getid(original)
+            counts[originalid] = counts.get(originalid, 0) + 1
+    return dups, counts
+
 
 def FormatObjects(f, trailer, version='1.3', compress=True, killobj=(),
+                  streaming=False, update=None, offset=0, object_streams=0,
+                  workers=None, dedup=False, stats=None,
                   id=id, isinstance=isinstance, getattr=getattr, len=len,
                   sum=sum, set=set, str=str, basestring=basestring,
                   hasattr=hasattr, repr=repr, enumerate=enumerate,
                   list=list, dict=dict, tuple=tuple,
                   do_compress=do_compress, PdfArray=PdfArray,
-                  PdfDict=PdfDict, PdfObject=PdfObject, encode=PdfString.encode):
+                  CompressionPolicy=CompressionPolicy,
+                  PdfDict=PdfDict, PdfObject=PdfObject, encode=PdfString.encode,
+                  PdfRawData=PdfRawData, PdfIndirect=PdfIndirect,
+                  rawrefs=rawrefs, findrefs=findrefs, int=int,
+                  isclean=isclean, dictitems=dict.items,
+                  listiter=list.__iter__, sorted=sorted, time=time.time):
     ''' FormatObjects performs the actual formatting and disk write.
         Should be a class, was a class, turned into nested functions
         for performace (to reduce attribute lookups).
+
+        If streaming is set, each object is written out as soon
+        as it has been formatted, so the objects are not in numeric
+        order in the file.  Otherwise, all the objects are formatted
+        before anything is written.
+
+        If update is a PdfReader, an incremental update to the
+        file it read is written, starting at file position offset.
+        Unchanged objects from the reader are referred to by their
+        original numbers rather than written out, changed ones
+        are written out with their original numbers, and new ones
+        are numbered from the /Size of the original file.
+
+        If object_streams is set, it is the largest number of
+        objects to put in each object stream, and a cross-reference
+        stream is written rather than a cross-reference table.
+
+        compress can be True or a CompressionPolicy.
+
+        If workers is more than 1, the streams are all compressed
+        before formatting starts, using that many threads.
+
+        If dedup is set, only one copy of objects that have the
+        same contents is written.
+
+        If stats is a PdfStats, timings and counts are added to it.
+
+        Returns the number of duplicate objects that were dropped,
+        and about how many bytes that saved.
     '''
 
     def add(obj):
         ''' Add an object to our list, if it's an indirect
             object.  Just format it if not.
         '''
+        # References from unchanged source data might
+        # not have been resolved yet.
+        if isinstance(obj, PdfIndirect):
+            if update is not None and isinstance(obj, placeholder):
+                # Anything that hasn't been read can't have changed.
+                value = loaded(obj)
+                if value is None:
+                    return '%s %s R' % (obj[0], obj[1])
+                obj = value
+            else:
+                obj = obj.real_value()
+            if obj is None:
+                return 'null'
+
         # Can't hash dicts, so just hash the object ID
         objid = id(obj)
 
         # Automatically set stream objects to indirect
         if isinstance(obj, PdfDict):
-            indirect = obj.indirect or (obj.stream is not None)
+            indirect = obj.indirect or (obj._stream is not None)
         else:
             indirect = getattr(obj, 'indirect', False)
 
@@ -70,25 +356,52 @@ def FormatObjects(f, trailer, version='1.3', compress=True, killobj=(),
             leaving(objid)
             return result
 
-        objnum = indirect_dict_get(objid)
+        # An object from a reader with a memory budget can be
+        # thrown away and read again, so go by its placeholder.
+        if isinstance(indirect, PdfIndirect):
+            objid = id(indirect)
+
+        ref = indirect_dict_get(objid)
 
         # If we haven't seen the object yet, we need to
         # add it to the indirect object list.
-        if objnum is None:
+        if ref is None:
             swapped = swapobj(objid)
             if swapped is not None:
                 old_id = objid
                 obj = swapped
-                objid = id(obj)
-                objnum = indirect_dict_get(objid)
-                if objnum is not None:
-                    indirect_dict[old_id] = objnum
-                    return '%s 0 R' % objnum
-            objnum = len(objlist) + 1
+                indirect = getattr(obj, 'indirect', False)
+                objid = id(isinstance(indirect, PdfIndirect) and indirect
+                           or obj)
+                ref = indirect_dict_get(objid)
+                if ref is not None:
+                    indirect_dict[old_id] = ref
+                    return ref
+            key = update is not None and oldkey(obj, indirect)
+            unchanged = key and (not isinstance(obj, (PdfDict, PdfArray))
+                                 or isclean(obj))
+            key = key or (newnum(), 0)
+            ref = '%s %s R' % key
+            indirect_dict[objid] = ref
+            if unchanged:
+                return ref
+            count = dupcounts.get(objid)
+            if count:
+                dupsizes[len(objlist)] = count
+            deferred.append((len(objlist), obj))
             objlist_append(None)
-            indirect_dict[objid] = objnum
-            deferred.append((objnum - 1, obj))
-        return '%s 0 R' % objnum
+            objkeys_append(key)
+        return ref
+
+    def oldkey(obj, indirect):
+        ''' Return the original (object number, generation)
+            of an object from the reader that is being updated,
+            or None for any other object.
+        '''
+        if isinstance(indirect, placeholder):
+            return indirect[0], indirect[1]
+        if isinstance(indirect, tuple) and loaded(indirect) is obj:
+            return indirect
 
     def format_array(myarray, formatter):
         # Format array data into semi-readable ASCII
@@ -109,29 +422,84 @@ def FormatObjects(f, trailer, version='1.3', compress=True, killobj=(),
             subarray.append(x)
         return formatter % lf_join([space_join(x) for x in bigarray])
 
-    def format_obj(obj):
+    def format_raw(obj):
+        ''' If an array or dictionary was read from a file and
+            has not been changed since, return the original source
+            data, with the object numbers in the references replaced.
+            Returns None if the object can't be copied this way.
+        '''
+        refs = {}
+        if obj.rawdata is None or not rawrefs(obj, refs):
+            return None
+        source = str(obj.rawdata)
+
+        # Make sure that the references we find in the text are
+        # exactly the ones that we found in the parsed object --
+        # if not, something like a string got in the way.
+        matches = []
+        for match in findrefs(source):
+            info = refs.get((int(match.group(1)), int(match.group(2))))
+            if info is None or not info[0]:
+                return None
+            info[0] -= 1
+            matches.append((match.span(), info[1]))
+        for info in refs.itervalues():
+            if info[0]:
+                return None
+
+        result = []
+        prev = 0
+        for (start, end), value in matches:
+            result.append(source[prev:start])
+            result.append(add(value))
+            prev = end
+        result.append(source[prev:])
+        return ''.join(result)
+
+    def format_obj(obj, compress=compress):
         ''' format PDF object data into semi-readable ASCII.
             May mutually recurse with add() -- add() will
             return references for indirect objects, and add
             the indirect object to the list.
+
+            A stream that has not been read from its source
+            yet is not read now, either -- the result is a
+            list of pieces with a buffer on the source data
+            in it, to be written straight out to the file.
+
+            compress is False for the object streams and the
+            cross-reference stream, which are built compressed.
         '''
         while 1:
             if isinstance(obj, (list, dict, tuple)):
                 if isinstance(obj, PdfArray):
-                    myarray = [add(x) for x in obj]
+                    result = format_raw(obj)
+                    if result is not None:
+                        return result
+                    myarray = [add(x) for x in arrayiter(obj)]
                     return format_array(myarray, '[%s]')
                 elif isinstance(obj, PdfDict):
-                    if compress and obj.stream:
-                        do_compress([obj])
-                    myarray = []
-                    dictkeys = [str(x) for x in obj.keys()]
-                    dictkeys.sort()
-                    for key in dictkeys:
-                        myarray.append(key)
-                        myarray.append(add(obj[key]))
-                    result = format_array(myarray, '<<%s>>')
-                    stream = obj.stream
-                    if stream is not None:
+                    if compress and obj._stream and \
+                            id(obj) not in precompressed:
+                        do_compress([obj], policy=policy, stats=stats)
+                    result = format_raw(obj)
+                    if result is None:
+                        myarray = []
+                        if update is None:
+                            dictkeys = [str(x) for x in obj.keys()]
+                            dictkeys.sort()
+                            items = [(key, obj[key]) for key in dictkeys]
+                        else:
+                            items = sorted(dictitems(obj))
+                        for key, value in items:
+                            myarray.append(key)
+                            myarray.append(add(value))
+                        result = format_array(myarray, '<<%s>>')
+                    stream = obj._stream
+                    if isinstance(stream, PdfRawData):
+                        result = ['%s\nstream\n' % result, stream.buffer(),
+                                  '\nendstream']
+                    elif stream is not None:
                         result = '%s\nstream\n%s\nendstream' % (result, stream)
                     return result
                 obj = (PdfArray, PdfDict)[isinstance(obj, dict)](obj)
@@ -141,24 +509,115 @@ def FormatObjects(f, trailer, version='1.3', compress=True, killobj=(),
                 return encode(obj)
             return str(getattr(obj, 'encoded', obj))
 
-    def format_deferred():
+    def write_obj(key, x):
+        ''' Write out an indirect object and return its length.
+        '''
+        if isinstance(x, list):
+            # Source data copied straight to the output
+            x[0] = '%s %s obj\n%s' % (key[0], key[1], x[0])
+            x.append('\nendobj\n')
+            for objstr in x:
+                f_write(objstr)
+            return sum([len(objstr) for objstr in x])
+        objstr = '%s %s obj\n%s\nendobj\n' % (key[0], key[1], x)
+        f_write(objstr)
+        return len(objstr)
+
+    def store_obj(index, x, offset):
+        ''' Keep a formatted object until the end, or, when
+            streaming, write it out straight away, and put its
+            file offset in objlist.  Returns the new file offset.
+        '''
+        if streaming:
+            objlist[index] = offset
+            offset += write_obj(objkeys[index], x)
+        else:
+            objlist[index] = x
+        return offset
+
+    def store_objstm(offset):
+        ''' Make an object stream out of the packed objects, and
+            store it.  The (object stream number, index) of each
+            packed object goes in objlist.
+        '''
+        stmnum = newnum()
+        header = []
+        pos = 0
+        for i, (index, x) in enumerate(packed):
+            objlist[index] = stmnum, i
+            header.append('%s %s' % (objkeys[index][0], pos))
+            pos += len(x) + 1
+        header = space_join(header) + '\n'
+        data = '\n'.join([x for index, x in packed])
+        stm = PdfDict(Type=PdfName.ObjStm, N=PdfObject(len(packed)),
+                      First=PdfObject(len(header)),
+                      Filter=PdfName.FlateDecode)
+        stm.stream = zlib.compress(header + data,
+                                   policy.getlevel(PdfName.ObjStm))
+        del packed[:]
+        index = len(objlist)
+        objlist_append(None)
+        objkeys_append((stmnum, 0))
+        return store_obj(index, format_obj(stm, False), offset)
+
+    def format_deferred(offset):
+        ''' Format the deferred objects, and return the file offset
+            after the last one that was written out.
+        '''
         while deferred:
             index, obj = deferred.pop()
-            objlist[index] = format_obj(obj)
+            x = format_obj(obj)
+            count = dupsizes.get(index)
+            if count:
+                size = isinstance(x, list) and sum(map(len, x)) or len(x)
+                dupsizes[index] = count * size
+            # Streams, and objects with a nonzero generation,
+            # can't go in object streams.
+            if (object_streams and isinstance(x, str) and
+                    not objkeys[index][1] and
+                    not (isinstance(obj, PdfDict) and
+                         obj._stream is not None)):
+                packed.append((index, x))
+                if len(packed) >= object_streams:
+                    offset = store_objstm(offset)
+                continue
+            offset = store_obj(index, x, offset)
+        if packed:
+            offset = store_objstm(offset)
+        return offset
 
     indirect_dict = {}
     indirect_dict_get = indirect_dict.get
     objlist = []
     objlist_append = objlist.append
+    objkeys = []
+    objkeys_append = objkeys.append
+    packed = []
+    dupsizes = {}
     visited = set()
     visiting = visited.add
     leaving = visited.remove
     space_join = ' '.join
     lf_join = '\n  '.join
     f_write = f.write
+    policy = isinstance(compress, CompressionPolicy) and compress or \
+        defaultpolicy
 
     deferred = []
 
+    if update is None:
+        newnum = itertools.count(1).next
+        arrayiter = iter
+    else:
+        # Don't read anything from the original file that
+        # we don't have to.
+        size = max([update.xref_size] +
+                   [key[0] + 1 for key in update.source.obj_offsets])
+        newnum = itertools.count(size).next
+        arrayiter = listiter
+        placeholder = update.placeholder
+        loaded = update.loaded
+
     # Don't reference old catalog or pages objects --
     # swap references to new ones.
     swapobj = {PdfName.Catalog: trailer.Root,
@@ -167,52 +626,149 @@ def FormatObjects(f, trailer, version='1.3', compress=True, killobj=(),
     swapobj = [(objid, swapobj(obj.Type)) for objid, obj in
                killobj.iteritems()]
     swapobj = dict((objid, obj is None and NullObject or obj) for objid, obj in
-                   swapobj).get
+                   swapobj)
+
+    # Objects that duplicate others are swapped for them, too.
+    dupcounts = {}
+    if dedup and update is None:
+        dups, dupcounts = finddups(trailer, killobj)
+        swapobj.update(dups)
+        killobj = set(killobj) | set(dups)
+        del dups
+    swapobj = swapobj.get
 
     for objid in killobj:
         assert swapobj(objid) is not None
 
+    # Compress the streams all at once, so that it can be
+    # done in parallel.
+    precompressed = set()
+    if compress and workers > 1 and update is None:
+        streams = findstreams(trailer, killobj)
+        do_compress(streams, workers, policy, stats)
+        precompressed = set([id(obj) for obj in streams])
+        del streams
+
+    header = '%%PDF-%s\n%%\xe2\xe3\xcf\xd3\n' % version
+    if update is not None:
+        header = ''
+    offset += len(header)
+    if streaming:
+        f_write(header)
+
     # The first format of trailer gets all the information,
     # but we throw away the actual trailer formatting.
+    phasestart = stats is not None and time()
     format_obj(trailer)
+    # Changed objects can be anywhere, so look at
+    # everything that has been read.
+    if update is not None:
+        for obj in update.loaded_objects():
+            add(obj)
     # Keep formatting until we're done.
     # (Used to recurse inside format_obj for this, but
     #  hit system limit.)
-    format_deferred()
-    # Now we know the size, so we update the trailer dict
-    # and get the formatted data.
-    trailer.Size = PdfObject(len(objlist) + 1)
-    trailer = format_obj(trailer)
+    offset = format_deferred(offset)
+    result = sum(dupcounts.itervalues()), sum(dupsizes.itervalues())
+    if stats is not None:
+        stats.addtime('format', time() - phasestart)
+        stats.add('objects_written', len(objlist))
+        phasestart = time()
+    # Now we know the size, so we update the trailer dict.
+    # (A cross-reference stream is an object, too.)
+    if object_streams:
+        xrefnum = newnum()
+    trailer.Size = PdfObject(newnum())
 
     # Now we have all the pieces to write out to the file.
     # Keep careful track of the counts while we do it so
     # we can correctly build the cross-reference.
 
-    header = '%%PDF-%s\n%%\xe2\xe3\xcf\xd3\n' % version
-    f_write(header)
-    offset = len(header)
-    offsets = [(0, 65535, 'f')]
-    offsets_append = offsets.append
-
-    for i, x in enumerate(objlist):
-        objstr = '%s 0 obj\n%s\nendobj\n' % (i + 1, x)
-        offsets_append((offset, 0, 'n'))
-        offset += len(objstr)
-        f_write(objstr)
-
-    f_write('xref\n0 %s\n' % len(offsets))
-    for x in offsets:
-        f_write('%010d %05d %s\r\n' % x)
-    f_write('trailer\n\n%s\nstartxref\n%s\n%%%%EOF\n' % (trailer, offset))
+    if not streaming:
+        f_write(header)
+        for i, x in enumerate(objlist):
+            if not isinstance(x, tuple):
+                objlist[i] = offset
+                offset += write_obj(objkeys[i], x)
+
+    # Each entry is (object number, type, offset or object
+    # stream number, generation or index in object stream),
+    # with the types used in cross-reference streams.
+    entries = []
+    for (num, gen), x in zip(objkeys, objlist):
+        if isinstance(x, tuple):
+            entries.append((num, 2) + x)
+        else:
+            entries.append((num, 1, x, gen))
+    if update is None:
+        entries.append((0, 0, 0, 65535))
+
+    if not object_streams:
+        # The cross-reference table has a subsection for each
+        # run of consecutive object numbers.
+        entries.sort()
+        f_write('xref\n')
+        for start, section in xrefsections(entries):
+            f_write('%s %s\n' % (start, len(section)))
+            for num, kind, x, gen in section:
+                f_write('%010d %05d %s\r\n' % (x, gen, 'fn'[kind]))
+        trailer = format_obj(trailer)
+        f_write('trailer\n\n%s\nstartxref\n%s\n%%%%EOF\n' %
+                (trailer, offset))
+        if stats is not None:
+            stats.addtime('write', time() - phasestart)
+        return result
+
+    # Build the cross-reference stream, which has the trailer
+    # dictionary entries in its own dictionary.
+    entries.append((xrefnum, 1, offset, 0))
+    entries.sort()
+    widths = [1]
+    for field in (2, 3):
+        width = len('%x' % max([x[field] for x in entries]))
+        widths.append((width + 1) // 2)
+    fmt = '%%02x%%0%dx%%0%dx' % (widths[1] * 2, widths[2] * 2)
+    index = []
+    data = []
+    for start, section in xrefsections(entries):
+        index += [start, len(section)]
+        data.extend([fmt % x[1:] for x in section])
+    xref = PdfDict(trailer)
+    xref.Type = PdfName.XRef
+    xref.W = PdfArray(widths)
+    xref.Index = PdfArray(index)
+    xref.Filter = PdfName.FlateDecode
+    xref.stream = zlib.compress(''.join(data).decode('hex'),
+                                policy.getlevel(PdfName.XRef))
+    write_obj((xrefnum, 0), format_obj(xref, False))
+    f_write('startxref\n%s\n%%%%EOF\n' % offset)
+    if stats is not None:
+        stats.addtime('write', time() - phasestart)
+    return result
 
 
 class PdfWriter(object):
 
     _trailer = None
 
-    def __init__(self, version='1.3', compress=False):
+    # How many objects to put in each object stream
+    objstm_size = 100
+
+    # Set by write() when dedup is used
+    dedup_count = dedup_saved = 0
+
+    def __init__(self, version='1.3', compress=False, streaming=False,
+                 object_streams=False, workers=None, dedup=False,
+                 stats=None):
+        if stats is True:
+            stats = PdfStats()
+        self.stats = stats
         self.pagearray = PdfArray()
         self.compress = compress
+        self.workers = workers
+        self.dedup = dedup
+        self.streaming = streaming
+        self.object_streams = object_streams
         self.version = version
         self.killobj = {}
 
@@ -237,7 +793,8 @@ class PdfWriter(object):
         killobj = self.killobj
         obj = page.Parent
         while obj is not None:
-            objid = id(obj)
+            indirect = obj.indirect
+            objid = id(isinstance(indirect, PdfIndirect) and indirect or obj)
             if objid in killobj:
                 break
             killobj[objid] = obj
@@ -286,10 +843,62 @@ class PdfWriter(object):
         # file object.
         preexisting = hasattr(fname, 'write')
         f = preexisting and fname or open(fname, 'wb')
-        FormatObjects(f, trailer, self.version, self.compress, self.killobj)
+        version = self.version
+        object_streams = self.object_streams and self.objstm_size
+        if object_streams and version < '1.5':
+            version = '1.5'
+        result = FormatObjects(f, trailer, version, self.compress,
+                               self.killobj, self.streaming,
+                               object_streams=object_streams,
+                               workers=self.workers, dedup=self.dedup,
+                               stats=self.stats)
+        self.dedup_count, self.dedup_saved = result
+        if self.dedup:
+            log.info('Dropped %d duplicate objects (about %d bytes)' % result)
         if not preexisting:
             f.close()
 
+    def write_incremental(self, reader, fname):
+        ''' Write out the file that reader read, with an incremental
+            update appended to it, holding the objects that have
+            been changed or added since then.  The update is made
+            from the reader's own objects and trailer (/Root, /Info
+            and /ID); the pages added to this writer are not used.
+
+            fname can be a file name or a file object.  If it is
+            the name of the file that the reader read, the update
+            is simply appended to the end of that file.
+        '''
+        if reader.startxref is None:
+            raise PdfOutputError('No cross-reference table to update')
+        fdata = reader.source.fdata
+        inplace = (isinstance(fname, basestring) and
+                   isinstance(reader.fname, basestring) and
+                   os.path.exists(fname) and
+                   os.path.samefile(fname, reader.fname))
+        preexisting = hasattr(fname, 'write')
+        if inplace:
+            f = open(fname, 'r+b')
+            f.seek(-1, 2)
+            lastch = f.read(1)
+            f.seek(0, 2)
+        else:
+            f = preexisting and fname or open(fname, 'wb')
+            f.write(buffer(fdata))
+            lastch = fdata[-1:]
+        try:
+            if lastch not in ('\n', '\r'):
+                f.write('\n')
+            offset = f.tell()
+            trailer = PdfDict(Root=reader.Root, Info=reader.Info, ID=reader.ID)
+            trailer.Prev = PdfObject(reader.startxref)
+            FormatObjects(f, trailer, compress=self.compress, killobj={},
+                          streaming=self.streaming, update=reader,
+                          offset=offset, stats=self.stats)
+        finally:
+            if not preexisting:
+                f.close()
+
 if __name__ == '__main__':
     import logging
     log.setLevel(logging.DEBUG)
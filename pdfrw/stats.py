@@ -0,0 +1,87 @@
+# A part of pdfrw (pdfrw.googlecode.com)
+# Copyright (C) 2006-2012 Patrick Maupin, Austin, Texas
+# MIT license -- See LICENSE.txt for details
+
+'''
+Optional statistics on what PdfReader and PdfWriter spend their
+time doing.
+
+A PdfStats object can be given to a PdfReader or a PdfWriter as
+the stats argument (or stats=True makes a new one), and is kept
+as their stats attribute.  It adds up the time spent in each
+phase of the work, counts the objects, streams and bytes that go
+through, and lists the problems in the file that were recovered
+from.  Nothing is recorded if stats are not asked for.
+
+Reader phases are xref (finding and parsing the cross-reference
+data), load (reading indirect objects) and decompress.  Writer
+phases are compress, format (formatting the objects) and write
+(writing them out, and the cross-reference data).  Phases can
+overlap -- object streams are decompressed while objects are
+being loaded, for example, and when streaming, objects are
+written out while they are being formatted.
+'''
+
+import time
+
+
+class PdfStats(object):
+    ''' times maps phase names to seconds, counts maps names to
+        totals, and events is a list of (kind, detail) pairs, one
+        for each problem that was recovered from.  (The number of
+        each kind of event is also in counts.)
+    '''
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.times = {}
+        self.counts = {}
+        self.events = []
+
+    def add(self, name, count=1):
+        counts = self.counts
+        counts[name] = counts.get(name, 0) + count
+
+    def addtime(self, phase, seconds):
+        times = self.times
+        times[phase] = times.get(phase, 0.0) + seconds
+
+    def event(self, kind, detail=None):
+        self.events.append((kind, detail))
+        self.add(kind)
+
+    def timed(self, phase, func, time=time.time):
+        ''' Return a function that calls func, and adds the
+            time it takes to phase.  If func ends up calling
+            itself (through the returned function), only the
+            outermost call is timed, so nothing is counted twice.
+        '''
+        addtime = self.addtime
+        active = []
+
+        def wrapper(*args, **kw):
+            if active:
+                return func(*args, **kw)
+            active.append(True)
+            start = time()
+            try:
+                return func(*args, **kw)
+            finally:
+                addtime(phase, time() - start)
+                active.pop()
+        return wrapper
+
+    def report(self):
+        ''' Return the times and counts as text.  (The events
+            themselves are not listed -- there could be a lot.)
+        '''
+        result = []
+        for phase, seconds in sorted(self.times.iteritems()):
+            result.append('%-24s %10.3f s' % (phase, seconds))
+        for name, count in sorted(self.counts.iteritems()):
+            result.append('%-24s %10d' % (name, count))
+        return '\n'.join(result)
+
+    __str__ = report
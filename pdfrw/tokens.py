@@ -8,21 +8,79 @@ A tokenizer for PDF streams.
 In general, documentation used was "PDF reference",
 sixth edition, for PDF version 1.7, dated November 2006.
 
+Tokenizers can share a TokenPool, so that the names and small
+integers used over and over again in every PDF file (/Type, /Page,
+0, 1, ...) are only created once, no matter how many files are
+open at the same time.
 '''
 
 from __future__ import generators
 
 import re
+import bisect
 import itertools
 from pdfrw.objects import PdfString, PdfObject
 from pdfrw.errors import log, PdfParseError
 
 
-def linepos(fdata, loc):
-    line = fdata.count('\n', 0, loc) + 1
-    line += fdata.count('\r', 0, loc) - fdata.count('\r\n', 0, loc)
-    col = loc - max(fdata.rfind('\n', 0, loc), fdata.rfind('\r', 0, loc))
-    return line, col
+def linepos(fdata, loc, start=(0, 1, 1), chunksize=1 << 20):
+    ''' Return the line and column of loc.  start is the
+        (location, line, column) of an earlier location to
+        count from.
+    '''
+    startloc, line, col = start
+    prevcr = startloc > 0 and fdata[startloc - 1:startloc] == '\r'
+    if isinstance(fdata, str):
+        line += fdata.count('\n', startloc, loc)
+        line += (fdata.count('\r', startloc, loc) -
+                 fdata.count('\r\n', startloc, loc))
+        line -= prevcr and loc > startloc and fdata[startloc] == '\n'
+    else:
+        # Memory-mapped data has no count() method; walk it in
+        # chunks rather than copying everything up to loc.
+        for start in xrange(startloc, loc, chunksize):
+            chunk = fdata[start:min(start + chunksize, loc)]
+            line += chunk.count('\n') + chunk.count('\r')
+            line -= chunk.count('\r\n') + (prevcr and chunk[:1] == '\n')
+            prevcr = chunk[-1:] == '\r'
+    linestart = max(fdata.rfind('\n', startloc, loc),
+                    fdata.rfind('\r', startloc, loc))
+    if linestart < 0:
+        # Still on the same line as startloc
+        return line, col + loc - startloc
+    return line, loc - linestart
+
+
+class TokenPool(dict):
+    ''' A bounded pool of name and small integer PdfObjects,
+        keyed by their text, that tokenizers can share.  Once
+        maxsize tokens are in the pool, no more are added.
+
+        The objects in the pool are shared by everything that
+        uses it, so they must never be changed.
+    '''
+
+    def __init__(self, maxsize=1 << 16, maxdigits=4):
+        self.maxsize = maxsize
+        self.maxdigits = maxdigits
+
+    def lookup(self, token, PdfObject=PdfObject, len=len,
+               dictget=dict.get):
+        ''' Return the pooled object for a name or integer token,
+            adding it to the pool if there is room, or None if the
+            token doesn't belong in the pool.
+        '''
+        result = dictget(self, token)
+        if result is None:
+            if token[0] == '/' or (token.isdigit() and
+                                   len(token) <= self.maxdigits):
+                result = PdfObject(token)
+                if len(self) < self.maxsize:
+                    self[token] = result
+        return result
+
+# A pool for all tokenizers to share
+shared_pool = TokenPool()
 
 
 class PdfTokens(object):
@@ -78,7 +136,7 @@ class PdfTokens(object):
         return result
 
     def fixname(self, cache, token, constructor, splitname=splitname,
-                join=''.join, cacheobj=_cacheobj):
+                join=''.join):
         ''' Inside name tokens, a '#' character indicates that
             the next two bytes are hex characters to be used
             to form the 'real' character.
@@ -88,11 +146,12 @@ class PdfTokens(object):
             self.warning('Invalid /Name token')
             return token
         substrs[1::2] = (chr(int(x, 16)) for x in substrs[1::2])
-        result = cacheobj(cache, join(substrs), constructor)
+        # Not cached -- the result remembers how it was spelled.
+        result = constructor(join(substrs))
         result.encoded = token
         return result
 
-    def _gettoks(self, startloc, cacheobj=_cacheobj, delimiters=delimiters,
+    def _gettoks(self, cacheobj=_cacheobj, delimiters=delimiters,
                  findtok=findtok, findparen=findparen, PdfString=PdfString,
                  PdfObject=PdfObject):
         ''' Given a source data string and a location inside it,
@@ -106,27 +165,50 @@ class PdfTokens(object):
             top to get a fresh one.
 
             We could use re.search instead of re.finditer, but that's slower.
+
+            Most tokens (numbers, names, keywords and delimiters) are
+            seen over and over again, so the cache is keyed by the
+            token text and checked first.  Comments, incomplete
+            literal strings and names containing '#' never go into
+            the cache, so anything found there can be used as-is.
+            Names and small integers come from the token pool, if
+            there is one.
         '''
         fdata = self.fdata
-        current = self.current = [(startloc, startloc)]
-        namehandler = (cacheobj, self.fixname)
+        current = self.current
+        fixname = self.fixname
         cache = {}
+        cacheget = cache.get
+        pool = self.pool
+        poolget = pool is not None and pool.lookup or (lambda token: None)
         while 1:
             for match in findtok(fdata, current[0][1]):
                 current[0] = tokspan = match.span()
                 token = match.group(1)
+                result = cacheget(token)
+                if result is not None:
+                    yield result
+                    if current[0] is not tokspan:
+                        break
+                    continue
                 firstch = token[0]
                 if firstch not in delimiters:
-                    token = cacheobj(cache, token, PdfObject)
+                    cache[token] = token = (poolget(token) or
+                                            PdfObject(token))
                 elif firstch in '/<(%':
                     if firstch == '/':
                         # PDF Name
-                        token = namehandler['#' in token](cache, token,
-                                                          PdfObject)
+                        if '#' in token:
+                            token = fixname(cache, token, PdfObject)
+                        else:
+                            cache[token] = token = (poolget(token) or
+                                                    PdfObject(token))
                     elif firstch == '<':
                         # << dict delim, or < hex string >
                         if token[1:2] != '<':
                             token = cacheobj(cache, token, PdfString)
+                        else:
+                            cache[token] = token
                     elif firstch == '(':
                         # Literal string
                         # It's probably simple, but maybe not
@@ -166,6 +248,8 @@ class PdfTokens(object):
                     else:
                         self.exception(('Tokenizer logic incorrect --'
                                         ' should never get here'))
+                else:
+                    cache[token] = token
 
                 yield token
                 if current[0] is not tokspan:
@@ -175,10 +259,17 @@ class PdfTokens(object):
                     break
                 raise StopIteration
 
-    def __init__(self, fdata, startloc=0, strip_comments=True):
+    # Locations that messages have been made for, in order, and
+    # their (line, column) pairs, so that lines are not counted
+    # from the start of the file for every message.
+    linelocs = None
+
+    def __init__(self, fdata, startloc=0, strip_comments=True, pool=None):
         self.fdata = fdata
         self.strip_comments = strip_comments
-        self.iterator = iterator = self._gettoks(startloc)
+        self.pool = pool
+        self.current = [(startloc, startloc)]
+        self.iterator = iterator = self._gettoks()
         self.next = iterator.next
 
     def setstart(self, startloc):
@@ -215,12 +306,28 @@ class PdfTokens(object):
             return result
         return default
 
+    def linepos(self, loc, bisect=bisect.bisect_right):
+        ''' Return the line and column of loc, counting lines from
+            the nearest earlier location a message was made for.
+        '''
+        locs = self.linelocs
+        if locs is None:
+            locs = self.linelocs = [0]
+            self.linecols = [(1, 1)]
+        linecols = self.linecols
+        index = bisect(locs, loc) - 1
+        result = linepos(self.fdata, loc, (locs[index],) + linecols[index])
+        if locs[index] != loc:
+            locs.insert(index + 1, loc)
+            linecols.insert(index + 1, result)
+        return result
+
     def msg(self, msg, *arg):
         if arg:
             msg %= arg
         fdata = self.fdata
         begin, end = self.current[0]
-        line, col = linepos(fdata, begin)
+        line, col = self.linepos(begin)
         if end > begin:
             tok = fdata[begin:end].rstrip()
             if len(tok) > 30:
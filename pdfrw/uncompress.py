@@ -3,99 +3,167 @@
 # MIT license -- See LICENSE.txt for details
 
 '''
-Currently, this sad little file only knows how to decompress
-using the flate (zlib) algorithm.  Maybe more later, but it's
-not a priority for me...
+Decodes streams in place, using the filters in pdfrw.filters.
+Streams that use several filters are decoded as far as possible;
+filters that can't be decoded (such as DCTDecode) are left on the
+stream.
+
+The decoded data of a stream can also be read a chunk at a time,
+without changing the stream, so that big streams (such as images)
+can be processed without decoding all of them at once.
 '''
 
-import zlib
-from pdfrw.objects import PdfDict, PdfName
-from pdfrw.errors import log
+import time
+from itertools import imap, izip
+from pdfrw.objects import PdfDict, PdfArray, PdfObject
+from pdfrw.filters import decoders, decode as decodechunks
+from pdfrw.errors import log, PdfParseError
 
 try:
-    from cStringIO import StringIO
+    from multiprocessing.pool import ThreadPool
 except ImportError:
-    from StringIO import StringIO
+    ThreadPool = None
 
 
 def streamobjects(mylist, isinstance=isinstance, PdfDict=PdfDict):
     for obj in mylist:
-        if isinstance(obj, PdfDict) and obj.stream is not None:
+        if isinstance(obj, PdfDict) and obj._stream is not None:
             yield obj
 
 
-def uncompress(mylist, warnings=set(), flate=PdfName.FlateDecode,
-               decompress=zlib.decompressobj, isinstance=isinstance, list=list, len=len):
+def workerpool(workers, jobs):
+    ''' Return a pool of worker threads for a list of jobs, or
+        None if one thread will do.
+    '''
+    if workers > 1 and len(jobs) > 1 and ThreadPool is not None:
+        return ThreadPool(workers)
+
+
+def filterlist(ftype, parms, isinstance=isinstance, list=list,
+               PdfDict=PdfDict):
+    ''' Return a list of (filter name, decode parameters) pairs
+        for a stream, from its /Filter and /DecodeParms.
+    '''
+    if not isinstance(ftype, list):
+        ftype = [ftype]
+    if not isinstance(parms, list):
+        parms = [parms]
+    parms = [isinstance(x, PdfDict) and x or None for x in parms]
+    parms += [None] * (len(ftype) - len(parms))
+    return zip(ftype, parms)
+
+
+def intparms(parms):
+    ''' Convert decode parameters to a plain dictionary
+        of integers, that the decoders can use in any thread.
+    '''
+    if parms is not None:
+        result = {}
+        for key, value in parms.iteritems():
+            try:
+                result[key] = int(value)
+            except (ValueError, TypeError):
+                pass
+        return result
+
+
+def decode(job, decodechunks=decodechunks):
+    ''' Decode the data of one stream, given a tuple of
+        (data, filters).  Returns a tuple of (data, error).  No PDF
+        objects are changed, so this can run in any thread.
+    '''
+    data, filters = job
+    try:
+        return ''.join(decodechunks(data, filters)), None
+    except Exception, s:
+        return data, str(s) or repr(s)
+
+
+def streamchunks(obj, decoders=decoders):
+    ''' Return an iterator over the decoded data of a stream
+        object, a chunk at a time.  The object is not changed,
+        and data that has not been read from the source file
+        yet is read as it is needed.
+
+        Raises PdfParseError if the stream uses a filter that
+        can't be decoded.  Errors in the data raise ValueError
+        as the chunks are read.
+    '''
+    ftype = obj.Filter
+    filters = ftype is not None and filterlist(ftype, obj.DecodeParms) or []
+    for name, parms in filters:
+        if name not in decoders:
+            raise PdfParseError('Cannot decode stream with filter %s' %
+                                repr(name))
+    return decodechunks(obj._stream or '',
+                        [(name, intparms(parms)) for name, parms in filters])
+
+
+def uncompress(mylist, warnings=set(), decoders=decoders,
+               isinstance=isinstance, len=len, workers=None, pool=None,
+               null=PdfObject('null'), stats=None, time=time.time):
+    ''' Decode the streams in mylist.  If workers is more
+        than 1, that many threads are used to do the work (zlib
+        releases the GIL), and the results are put back in the
+        objects by the calling thread.  (Or a pool of threads
+        that the caller will take care of can be passed in.)
+
+        If stats is a PdfStats, the time taken and the number
+        of streams and bytes decoded are added to it.
+
+        Returns False if any stream could not be completely decoded.
+    '''
+    start = stats is not None and time()
     ok = True
+    objs = []
+    jobs = []
     for obj in streamobjects(mylist):
         ftype = obj.Filter
         if ftype is None:
             continue
-        if isinstance(ftype, list) and len(ftype) == 1:
-            # todo: multiple filters
-            ftype = ftype[0]
-        parms = obj.DecodeParms
-        if ftype != flate or parms is not None:
-            msg = 'Not decompressing: cannot use filter %s with parameters %s' % (repr(ftype), repr(parms))
-            if msg not in warnings:
-                warnings.add(msg)
-                log.warning(msg)
-            ok = False
-        else:
-            dco = decompress()
-            error = None
-            try:
-                data = dco.decompress(obj.stream)
-                if parms:
-                    # try png predictor
-                    predictor = int(parms['/Predictor']) or 1
-                    # predictor 1 == no predictor
-                    if predictor != 1:
-                        columns = int(parms['/Columns'])
-                        # PNG prediction:
-                        if predictor >= 10 and predictor <= 15:
-                            output = StringIO()
-                            # PNG prediction can vary from row to row
-                            rowlen = columns + 1
-                            assert len(data) % rowlen == 0
-                            prev_rowdata = (0,) * rowlen
-                            for row in xrange(len(data) / rowlen):
-                                rowdata = [ord(x) for x in
-                                    data[(row * rowlen):((row + 1) * rowlen)]]
-                                filter_byte = rowdata[0]
-                                if filter_byte == 0:
-                                    pass
-                                elif filter_byte == 1:
-                                    for i in xrange(2, rowlen):
-                                        rowdata[i] = (rowdata[i] +
-                                                      rowdata[i - 1]) % 256
-                                elif filter_byte == 2:
-                                    for i in xrange(1, rowlen):
-                                        rowdata[i] = (rowdata[i] +
-                                                      prev_rowdata[i]) % 256
-                                else:
-                                    # unsupported PNG filter
-                                    raise Exception(('Unsupported PNG '
-                                                    'filter %r') % filter_byte)
-                                prev_rowdata = rowdata
-                                output.write(''.join([chr(x) for x in
-                                                      rowdata[1:]]))
-                            data = output.getvalue()
-                        else:
-                            # unsupported predictor
-                            raise Exception(('Unsupported flatedecode'
-                                            ' predictor %r') % predictor)
-
-            except Exception, s:
-                error = str(s)
-            if error is None:
-                assert not dco.unconsumed_tail
-                if dco.unused_data.strip():
-                    error = 'Unconsumed compression data: %s' % repr(
-                        dco.unused_data[:20])
+        filters = filterlist(ftype, obj.DecodeParms)
+        count = 0
+        for name, parms in filters:
+            if name not in decoders:
+                msg = 'Not decompressing: cannot use filter %s with parameters %s' % (repr(name), repr(parms))
+                if msg not in warnings:
+                    warnings.add(msg)
+                    log.warning(msg)
+                ok = False
+                break
+            count += 1
+        if count:
+            objs.append((obj, filters[count:]))
+            jobs.append((obj._stream, [(name, intparms(parms))
+                                       for name, parms in filters[:count]]))
+    mypool = pool is None and workerpool(workers, jobs) or None
+    pool = pool or mypool
+    try:
+        results = (pool is not None and pool.imap or imap)(decode, jobs)
+        for (obj, rest), (data, error) in izip(objs, results):
             if error is None:
-                obj.Filter = None
+                ftype = [name for name, parms in rest]
+                parms = [parms for name, parms in rest]
+                if len(rest) != 1:
+                    ftype = ftype and PdfArray(ftype) or None
+                    parms = (any(x is not None for x in parms) and
+                             PdfArray(x is None and null or x
+                                      for x in parms) or None)
+                else:
+                    ftype, = ftype
+                    parms, = parms
+                obj.Filter = ftype
+                obj.DecodeParms = parms
                 obj.stream = data
+                if stats is not None:
+                    stats.add('streams_decompressed')
+                    stats.add('bytes_decompressed', len(data))
             else:
                 log.error('%s %s' % (error, repr(obj.indirect)))
+                ok = False
+    finally:
+        if mypool is not None:
+            mypool.terminate()
+        if stats is not None:
+            stats.addtime('decompress', time() - start)
     return ok
@@ -0,0 +1,115 @@
+# A part of pdfrw (pdfrw.googlecode.com)
+# Copyright (C) 2006-2012 Patrick Maupin, Austin, Texas
+# MIT license -- See LICENSE.txt for details
+
+'''
+An on-disk cache of the cross-reference information of PDF files,
+so that a file that is opened over and over again doesn't have to
+have its xref tables/streams parsed every time.
+
+The cache for a file is either a "sidecar" file next to it
+(if the cache location is given as True) or a file in a cache
+directory.  It is keyed by the size and modification time of
+the PDF file, plus a hash of the data at the end of the file
+(where the trailer lives), and is simply ignored if any of
+those do not match.
+'''
+
+import os
+import marshal
+import hashlib
+
+from pdfrw.objects import PdfDict, PdfArray, PdfIndirect
+from pdfrw.errors import log
+
+# Bump this if the contents of the cache change
+CACHE_VERSION = 4
+
+# The trailer entries we keep
+TRAILER_KEYS = '/Root /Info /ID /Version /Size /Encrypt'.split()
+
+
+def cachefile(fname, location):
+    ''' Return the name of the cache file for a PDF file
+    '''
+    if location is True:
+        return fname + '.xref'
+    name = hashlib.sha1(os.path.abspath(fname)).hexdigest()
+    return os.path.join(location, name + '.xref')
+
+
+def cachekey(fname, fdata, endloc, tailsize=1024):
+    ''' Return the key that the cached information has
+        to match:  file size, modification time, and
+        a hash of the end of the file.
+    '''
+    info = os.stat(fname)
+    tail = fdata[max(endloc - tailsize, 0):endloc]
+    return info.st_size, info.st_mtime, hashlib.sha1(tail).hexdigest()
+
+
+def format_obj(obj, isinstance=isinstance, tuple=tuple, str=str):
+    ''' Format a (trailer) object back into PDF syntax,
+        without resolving any references.
+    '''
+    if isinstance(obj, PdfIndirect):
+        return '%d %d R' % obj
+    indirect = getattr(obj, 'indirect', False)
+    if isinstance(indirect, tuple):
+        return '%d %d R' % indirect
+    if isinstance(obj, PdfDict):
+        return '<<%s>>' % ' '.join('%s %s' % (key, format_obj(value))
+                                   for key, value in dict.iteritems(obj))
+    if isinstance(obj, PdfArray):
+        return '[%s]' % ' '.join(format_obj(x) for x in list.__iter__(obj))
+    return str(getattr(obj, 'encoded', obj))
+
+
+def format_trailer(trailer):
+    result = PdfDict()
+    for key in TRAILER_KEYS:
+        value = dict.get(trailer, key)
+        if value is not None:
+            dict.__setitem__(result, key, value)
+    return format_obj(result)
+
+
+def load(fname, key):
+    ''' Return the cached information, if there is any,
+        and it matches the key.
+    '''
+    try:
+        f = open(fname, 'rb')
+        try:
+            info = marshal.load(f)
+        finally:
+            f.close()
+    except (EnvironmentError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(info, dict):
+        return None
+    if info.get('version') != CACHE_VERSION or info.get('key') != key:
+        return None
+    return info
+
+
+def save(fname, key, info):
+    ''' Write the information out to the cache.  The data
+        is written to a temporary file first, so that other
+        processes never see a partially written cache file.
+    '''
+    info = dict(info, version=CACHE_VERSION, key=key)
+    tmpname = '%s.%d.tmp' % (fname, os.getpid())
+    try:
+        f = open(tmpname, 'wb')
+        try:
+            marshal.dump(info, f)
+        finally:
+            f.close()
+        os.rename(tmpname, fname)
+    except EnvironmentError, s:
+        log.warning('Could not write xref cache file %s: %s' % (fname, s))
+        try:
+            os.remove(tmpname)
+        except EnvironmentError:
+            pass
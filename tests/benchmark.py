@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+
+'''
+Benchmarks reading, decompressing and writing a corpus of
+synthetic PDF files, and saves the results as JSON, so that runs
+on different commits can be compared.
+
+usage:   benchmark.py [pdfrw directory] [options]
+
+The corpus is made (with pdfrw) the first time it is needed, and
+kept in the corpus directory.  It has files with:
+
+    pages       -- many pages, each with its own content stream
+    deeptree    -- pages in a page tree two kids wide
+    objstreams  -- objects in object streams, with an xref stream
+    images      -- a few big flate compressed images
+    smallobjs   -- a great many small indirect objects
+
+Each file is measured in a separate process, so that the peak RSS
+belongs to that file alone.  For each file, the results have:
+
+    open        -- seconds for PdfReader() to open the file
+    read_all    -- seconds to read all the objects
+    write       -- seconds to write the file out again
+    uncompress  -- seconds to decompress all the streams
+    objects     -- number of indirect objects read
+    file_size   -- size of the file, in bytes
+    read_rate   -- objects read per second (open and read_all)
+    write_rate  -- objects written per second
+    peak_rss    -- peak resident set size, in kilobytes
+
+Each time is the best of --repeat runs.  If --compare is given, the
+new results are printed next to the ones in that JSON file.
+'''
+
+import sys
+import os
+import gc
+import json
+import optparse
+import random
+import resource
+import subprocess
+import tempfile
+import time
+
+args = sys.argv[1:]
+if args and os.path.isdir(args[0]):
+    sys.path.insert(0, args.pop(0))
+
+try:
+    import pdfrw
+except ImportError:
+    import find_pdfrw
+
+from pdfrw import PdfReader, PdfWriter, PdfDict, PdfArray, PdfName
+from pdfrw import PdfObject, IndirectPdfDict
+from pdfrw.compress import compresschunks
+
+parser = optparse.OptionParser(usage='%prog [pdfrw directory] [options]')
+parser.add_option('-d', '--corpus', default='benchcorpus',
+                  help='directory for the synthetic files [%default]')
+parser.add_option('-o', '--output', default='benchmark.json',
+                  help='JSON file for the results [%default]')
+parser.add_option('-s', '--scale', type='float', default=1.0,
+                  help='size of the corpus, relative to the default')
+parser.add_option('-r', '--repeat', type='int', default=3,
+                  help='number of times to measure each file [%default]')
+parser.add_option('-c', '--compare', help='earlier results to compare with')
+parser.add_option('--measure', help=optparse.SUPPRESS_HELP)
+
+options, args = parser.parse_args(args)
+scale = options.scale
+
+words = 'BT ET Tf Td Tj TJ q Q cm re f S 0 1 12 100 (Hello) /F1'.split()
+
+
+def content(rand, count):
+    ''' A content stream of count random operators and operands
+    '''
+    return ' '.join([rand.choice(words) for i in xrange(count)])
+
+
+def mkpage(stream, resources=None):
+    contents = IndirectPdfDict()
+    contents.stream = stream
+    return IndirectPdfDict(Type=PdfName.Page,
+                           MediaBox=PdfArray([0, 0, 612, 792]),
+                           Resources=resources or PdfDict(),
+                           Contents=contents)
+
+
+def mkpages(rand, count, words=200):
+    return [mkpage(content(rand, words)) for i in xrange(count)]
+
+
+def write(fname, pages, tree=None, **kw):
+    writer = PdfWriter(compress=True, **kw)
+    if tree is None:
+        writer.addpages(pages)
+        writer.write(fname)
+    else:
+        catalog = IndirectPdfDict(Type=PdfName.Catalog, Pages=tree)
+        writer.write(fname, PdfDict(Root=catalog))
+
+
+def pagetree(pages, parent=None):
+    ''' Build a page tree that is two kids wide, so it is
+        as deep as possible.
+    '''
+    node = IndirectPdfDict(Type=PdfName.Pages, Count=PdfObject(len(pages)))
+    if parent is not None:
+        node.Parent = parent
+    if len(pages) <= 2:
+        for page in pages:
+            page.Parent = node
+        node.Kids = PdfArray(pages)
+    else:
+        half = len(pages) // 2
+        node.Kids = PdfArray([pagetree(pages[:half], node),
+                              pagetree(pages[half:], node)])
+    return node
+
+
+def make_pages(fname, rand):
+    write(fname, mkpages(rand, int(5000 * scale)))
+
+
+def make_deeptree(fname, rand):
+    write(fname, None, pagetree(mkpages(rand, int(4000 * scale))))
+
+
+def make_objstreams(fname, rand):
+    write(fname, mkpages(rand, int(5000 * scale)), object_streams=True)
+
+
+def make_images(fname, rand, width=2000, height=1500):
+    pages = []
+    for i in xrange(max(1, int(8 * scale))):
+        image = IndirectPdfDict(Type=PdfName.XObject,
+                                Subtype=PdfName.Image,
+                                Width=width, Height=height,
+                                ColorSpace=PdfName.DeviceRGB,
+                                BitsPerComponent=8)
+        # Smooth gradients with some noise, like a photograph
+        rowlen = width * 3
+        pattern = ''.join([chr((x & 0xF8) | rand.randint(0, 7))
+                           for x in xrange(rowlen + 512)])
+        rows = (pattern[(y * 7 + i * 32) % 512:][:rowlen]
+                for y in xrange(height))
+        compresschunks(image, rows)
+        resources = PdfDict(XObject=PdfDict(Im0=image))
+        pages.append(mkpage('q 612 0 0 792 0 0 cm /Im0 Do Q', resources))
+    write(fname, pages)
+
+
+def make_smallobjs(fname, rand):
+    pages = mkpages(rand, 10, 20)
+    count = int(100000 * scale)
+    things = PdfArray([IndirectPdfDict(Index=PdfObject(i),
+                                       Value=PdfArray([rand.random(), i]))
+                       for i in xrange(count)])
+    for i, page in enumerate(pages):
+        page.Things = PdfArray(things[i::len(pages)])
+    write(fname, pages)
+
+
+corpus = [
+    ('pages', make_pages),
+    ('deeptree', make_deeptree),
+    ('objstreams', make_objstreams),
+    ('images', make_images),
+    ('smallobjs', make_smallobjs),
+]
+
+
+def makecorpus():
+    ''' Make any of the corpus files that don't exist yet,
+        and return a list of (name, file name) pairs.
+    '''
+    if not os.path.exists(options.corpus):
+        os.makedirs(options.corpus)
+    result = []
+    for name, make in corpus:
+        fname = os.path.join(options.corpus, '%s_%s.pdf' % (name, scale))
+        if not os.path.exists(fname):
+            print 'Making', fname
+            make(fname + '.tmp', random.Random(name))
+            os.rename(fname + '.tmp', fname)
+        result.append((name, fname))
+    return result
+
+
+def peakrss():
+    ''' Peak resident set size of this process, in kilobytes.
+        (On Linux, getrusage includes the process this one was
+        started from, so /proc is used if it is there.)
+    '''
+    try:
+        for line in open('/proc/self/status'):
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+    except IOError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def timed(func, *args):
+    start = time.time()
+    result = func(*args)
+    return time.time() - start, result
+
+
+def measure(fname):
+    ''' Measure one file (in a process of its own).
+    '''
+    outf, outfname = tempfile.mkstemp('.pdf')
+    os.close(outf)
+    best = {}
+    try:
+        for i in xrange(options.repeat):
+            gc.collect()
+            times = {}
+            times['open'], reader = timed(PdfReader, fname)
+            times['read_all'], ignore = timed(reader.read_all)
+            objects = len(reader.indirect_objects)
+            times['write'], ignore = timed(PdfWriter().write, outfname, reader)
+            written = int(reader.Size) - 1
+            times['uncompress'], ignore = timed(reader.uncompress)
+            del reader, ignore
+            for key, value in times.iteritems():
+                best[key] = min(best.get(key, value), value)
+    finally:
+        os.remove(outfname)
+    best['objects'] = objects
+    best['read_rate'] = objects / max(best['open'] + best['read_all'], 1e-6)
+    best['write_rate'] = written / max(best['write'], 1e-6)
+    best['file_size'] = os.path.getsize(fname)
+    best['peak_rss'] = peakrss()
+    return best
+
+
+def gitcommit():
+    try:
+        proc = subprocess.Popen(['git', 'rev-parse', 'HEAD'],
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                cwd=os.path.dirname(pdfrw.__file__))
+        return proc.communicate()[0].strip() or None
+    except OSError:
+        return None
+
+
+fields = [('open', '%8.3f'), ('read_all', '%8.3f'), ('write', '%8.3f'),
+          ('uncompress', '%8.3f'), ('read_rate', '%8d'),
+          ('write_rate', '%8d'), ('peak_rss', '%8d')]
+
+
+def report(results, old):
+    print '%-12s' % 'file', ' '.join(['%8s' % x[:8] for x, fmt in fields])
+    for name, info in sorted(results.iteritems()):
+        print '%-12s' % name, ' '.join([fmt % info[x] for x, fmt in fields])
+        oldinfo = old.get(name)
+        if oldinfo is not None:
+            print '%-12s' % '  (was)', ' '.join([fmt % oldinfo.get(x, 0)
+                                                 for x, fmt in fields])
+
+
+if options.measure:
+    print json.dumps(measure(options.measure))
+    sys.exit(0)
+
+files = makecorpus()
+results = {}
+pdfrwdir = os.path.dirname(os.path.dirname(os.path.abspath(pdfrw.__file__)))
+for name, fname in files:
+    print 'Measuring', fname
+    sys.stdout.flush()
+    cmd = [sys.executable, os.path.abspath(__file__), pdfrwdir,
+           '--repeat', str(options.repeat), '--measure', fname]
+    output = subprocess.Popen(cmd, stdout=subprocess.PIPE).communicate()[0]
+    results[name] = json.loads(output.splitlines()[-1])
+
+old = {}
+if options.compare:
+    old = json.load(open(options.compare))['results']
+
+report(results, old)
+
+info = dict(
+    commit=gitcommit(),
+    date=time.strftime('%Y-%m-%d %H:%M:%S'),
+    python=sys.version.split()[0],
+    platform=sys.platform,
+    scale=scale,
+    repeat=options.repeat,
+    results=results,
+)
+f = open(options.output, 'wb')
+json.dump(info, f, indent=2, sort_keys=True)
+f.close()
+print 'Results saved in', options.output
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+'''
+Checks that a PdfReader with a memory budget never loses changes
+to objects that it throws away and reads again.
+
+usage:   budgetedits.py [pdfrw directory]
+
+A small file is made in a temporary directory.  Parts of its
+first page (direct arrays and dictionaries inside the page) are
+held on to, then every other page is read with a tiny budget so
+that the reader tries to throw the first page away.  The parts
+are changed afterwards, and the changes must show up both in the
+page as it is read again and in the file that is written out.
+'''
+
+import sys
+import os
+import shutil
+import tempfile
+
+args = sys.argv[1:]
+if args and os.path.isdir(args[0]):
+    sys.path.insert(0, args.pop(0))
+
+try:
+    import pdfrw
+except ImportError:
+    import find_pdfrw
+
+from pdfrw import PdfReader, PdfWriter, PdfDict, PdfArray, PdfName
+from pdfrw import IndirectPdfDict
+
+
+def makefile(fname, count=50):
+    pages = []
+    for i in xrange(count):
+        contents = IndirectPdfDict()
+        contents.stream = 'BT /F1 12 Tf 72 720 Td (Page %d) Tj ET' % i
+        font = PdfDict(Type=PdfName.Font, Subtype=PdfName.Type1,
+                       BaseFont=PdfName.Helvetica)
+        pages.append(IndirectPdfDict(
+            Type=PdfName.Page,
+            MediaBox=PdfArray([0, 0, 612, 792]),
+            Resources=PdfDict(Font=PdfDict(F1=font)),
+            Contents=contents))
+    writer = PdfWriter()
+    writer.addpages(pages)
+    writer.write(fname)
+
+
+def readothers(reader):
+    ''' Read every page but the first.  (Slicing reader.pages
+        would read them all into a list, and keep them.)
+    '''
+    pages = reader.pages
+    for index in xrange(1, len(pages)):
+        pages[index].Contents.stream
+
+
+def check(name, change, verify, tmpdir):
+    fname = os.path.join(tmpdir, 'in.pdf')
+    outfname = os.path.join(tmpdir, name + '.pdf')
+    reader = PdfReader(fname, memory_budget=1)
+    part = change(reader.pages[0], None)
+    readothers(reader)
+    change(None, part)
+    assert verify(reader.pages[0]), '%s: change lost in reader' % name
+    writer = PdfWriter()
+    writer.addpages(reader.pages)
+    writer.write(outfname)
+    assert verify(PdfReader(outfname).pages[0]), \
+        '%s: change lost in output' % name
+    print '%-24s ok' % name
+
+
+def mediabox(page, part):
+    if page is not None:
+        return page.MediaBox
+    part[2] = 400
+
+
+def font(page, part):
+    if page is not None:
+        return page.Resources.Font.F1
+    part.BaseFont = PdfName.Courier
+
+
+tests = [
+    ('held MediaBox', mediabox, lambda page: int(page.MediaBox[2]) == 400),
+    ('held font dictionary', font,
+     lambda page: page.Resources.Font.F1.BaseFont == PdfName.Courier),
+]
+
+tmpdir = tempfile.mkdtemp()
+try:
+    makefile(os.path.join(tmpdir, 'in.pdf'))
+    for name, change, verify in tests:
+        check(name, change, verify, tmpdir)
+finally:
+    shutil.rmtree(tmpdir)
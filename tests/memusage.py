@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+'''
+Reports how much memory the PDF objects of files take once
+they have all been read.
+
+usage:   memusage.py [pdfrw directory] [file.pdf ...]
+
+If no files are given, the files in data/allpdfs.txt are used.
+'''
+
+import sys
+import gc
+import os
+
+args = sys.argv[1:]
+if args and os.path.isdir(args[0]):
+    sys.path.insert(0, args.pop(0))
+
+try:
+    import pdfrw
+except ImportError:
+    import find_pdfrw
+
+import pdfrw
+
+from pdfrw import PdfReader, PdfDict, PdfArray, PdfObject
+from pdfrw.objects import PdfIndirect
+
+allfiles = args or (x.split('#', 1)[0] for x in
+                    open('data/allpdfs.txt').read().splitlines())
+allfiles = [x for x in allfiles if x]
+
+kinds = (PdfDict, PdfArray, PdfIndirect, PdfObject)
+
+
+def rss():
+    ''' Resident set size in bytes (Linux only)
+    '''
+    try:
+        return int(open('/proc/self/statm').read().split()[1]) * 4096
+    except IOError:
+        return 0
+
+
+def objsize(obj, getsizeof=sys.getsizeof):
+    ''' Size of an object, including its attribute dictionary
+        (if it has one -- looking for it doesn't create it).
+    '''
+    size = getsizeof(obj)
+    try:
+        attrs = object.__getattribute__(obj, '__dict__')
+    except (AttributeError, TypeError):
+        pass
+    else:
+        if attrs:
+            size += getsizeof(attrs)
+    return size
+
+
+def measure(fname):
+    gc.collect()
+    before = rss()
+    reader = PdfReader(fname)
+    reader.read_all()
+    # Resolve all the references, too
+    for obj in reader.indirect_objects.values():
+        if isinstance(obj, (PdfDict, PdfArray)):
+            list(obj.iteritems() if isinstance(obj, PdfDict) else obj)
+    gc.collect()
+    after = rss()
+
+    counts = dict((kind, [0, 0]) for kind in kinds)
+    for obj in gc.get_objects():
+        for kind in kinds:
+            if isinstance(obj, kind):
+                info = counts[kind]
+                info[0] += 1
+                info[1] += objsize(obj)
+                break
+    return reader, after - before, counts
+
+
+grand = 0
+for fname in allfiles:
+    reader, delta, counts = measure(fname)
+    print 'File name', fname
+    total = 0
+    for kind in kinds:
+        count, size = counts[kind]
+        total += size
+        print '    %-12s %8d objects %12d bytes' % (kind.__name__, count, size)
+    print '    %-12s %8s         %12d bytes' % ('total', '', total)
+    print '    RSS growth                     %12d bytes' % delta
+    print
+    grand += total
+    del reader
+print 'Total object bytes for all files = %d' % grand
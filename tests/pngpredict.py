@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+'''
+Times PNG predictor decoding on synthetic cross-reference and
+image data, comparing the old decoder (a loop over lists of
+integers) with the current one, with and without numpy.
+
+usage:   pngpredict.py [pdfrw directory]
+
+The old decoder only knows the None, Sub and Up filters, and
+only one byte per pixel, so it is only timed where it works.
+'''
+
+import sys
+import os
+import random
+import time
+
+args = sys.argv[1:]
+if args and os.path.isdir(args[0]):
+    sys.path.insert(0, args.pop(0))
+
+try:
+    import pdfrw
+except ImportError:
+    import find_pdfrw
+
+from pdfrw import filters
+
+
+def oldpredictor(data, columns):
+    ''' The PNG predictor code from before the decoders were
+        rewritten.
+    '''
+    output = []
+    rowlen = columns + 1
+    assert len(data) % rowlen == 0
+    prev_rowdata = (0,) * rowlen
+    for row in xrange(len(data) / rowlen):
+        rowdata = [ord(x) for x in
+                   data[(row * rowlen):((row + 1) * rowlen)]]
+        filter_byte = rowdata[0]
+        if filter_byte == 0:
+            pass
+        elif filter_byte == 1:
+            for i in xrange(2, rowlen):
+                rowdata[i] = (rowdata[i] + rowdata[i - 1]) % 256
+        elif filter_byte == 2:
+            for i in xrange(1, rowlen):
+                rowdata[i] = (rowdata[i] + prev_rowdata[i]) % 256
+        else:
+            raise Exception('Unsupported PNG filter %r' % filter_byte)
+        prev_rowdata = rowdata
+        output.append(''.join([chr(x) for x in rowdata[1:]]))
+    return ''.join(output)
+
+
+def newpredictor(data, rowlen, bpp, numpy):
+    return ''.join(filters.pngpredictor(filters.chunks(data), rowlen, bpp,
+                                        numpy=numpy))
+
+
+def makedata(rows, rowlen, filter_bytes):
+    ''' Random predicted rows, using the given filters in turn.
+    '''
+    rand = random.Random(rows * rowlen)
+    rowdata = [chr(filter_bytes[row % len(filter_bytes)]) +
+               ''.join(chr(rand.randint(0, 15)) for i in xrange(rowlen))
+               for row in xrange(rows)]
+    return ''.join(rowdata)
+
+
+def timeit(func, *args):
+    start = time.time()
+    result = func(*args)
+    return time.time() - start, result
+
+
+cases = [
+    # name, rows, bytes per row, bytes per pixel, filters
+    ('xref stream (Up)', 200000, 5, 1, [2]),
+    ('gray image (Sub/Up)', 2000, 2000, 1, [0, 1, 2]),
+    ('RGB image (Sub/Up)', 1000, 3000, 3, [1, 2]),
+    ('RGB image (all filters)', 1000, 3000, 3, [0, 1, 2, 3, 4]),
+    # 4-bit RGB, 1003 columns:  rows are not whole pixels long
+    ('4-bit RGB image (Sub/Up)', 1000, 1505, 2, [1, 2]),
+]
+
+for name, rows, rowlen, bpp, filter_bytes in cases:
+    data = makedata(rows, rowlen, filter_bytes)
+    print '%s: %d rows of %d bytes' % (name, rows, rowlen)
+    expected = None
+    if bpp == 1 and max(filter_bytes) <= 2:
+        elapsed, expected = timeit(oldpredictor, data, rowlen)
+        print '    %-20s %8.3f seconds' % ('old loop', elapsed)
+    for label, numpy in (('no numpy', None), ('numpy', filters.numpy)):
+        if label == 'numpy' and numpy is None:
+            print '    %-20s (not installed)' % label
+            continue
+        elapsed, result = timeit(newpredictor, data, rowlen, bpp, numpy)
+        if expected is None:
+            expected = result
+        assert result == expected, name
+        print '    %-20s %8.3f seconds' % (label, elapsed)
+    print
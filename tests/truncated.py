@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+'''
+Checks that files which have been cut short can still be read.
+
+usage:   truncated.py [pdfrw directory] [file.pdf ...]
+
+Each file is cut off at several points (a small file is made in
+a temporary directory if no files are given), and every object
+of what is left is read, and written out again.  Objects that
+are cut off should be treated as missing, rather than causing
+an exception.
+'''
+
+import sys
+import os
+import shutil
+import tempfile
+
+args = sys.argv[1:]
+if args and os.path.isdir(args[0]):
+    sys.path.insert(0, args.pop(0))
+
+try:
+    import pdfrw
+except ImportError:
+    import find_pdfrw
+
+from pdfrw import PdfReader, PdfWriter, PdfArray, PdfName, IndirectPdfDict
+
+fractions = 0.5, 0.9, 0.97, 0.999
+
+
+def makefile(fname, count=20):
+    ''' Pages with content streams of different sizes, so that
+        the cuts land inside streams as well as dictionaries.
+    '''
+    pages = []
+    for i in xrange(count):
+        contents = IndirectPdfDict()
+        contents.stream = '0 0 m 100 100 l S\n' * (i * 50 + 1)
+        pages.append(IndirectPdfDict(Type=PdfName.Page,
+                                     MediaBox=PdfArray([0, 0, 612, 792]),
+                                     Contents=contents))
+    writer = PdfWriter()
+    writer.addpages(pages)
+    writer.write(fname)
+
+
+def check(fname, tmpdir):
+    data = open(fname, 'rb').read()
+    cutfname = os.path.join(tmpdir, 'cut.pdf')
+    outfname = os.path.join(tmpdir, 'out.pdf')
+    for fraction in fractions:
+        f = open(cutfname, 'wb')
+        f.write(data[:int(len(data) * fraction)])
+        f.close()
+        reader = PdfReader(cutfname)
+        reader.read_all()
+        PdfWriter().write(outfname, reader)
+        print '%-40s %5.3f  %d objects missing' % (
+            os.path.basename(fname), fraction, len(reader.missing_objects))
+
+
+tmpdir = tempfile.mkdtemp()
+try:
+    if not args:
+        args = [os.path.join(tmpdir, 'sample.pdf')]
+        makefile(args[0])
+    for fname in args:
+        check(fname, tmpdir)
+finally:
+    shutil.rmtree(tmpdir)